@@ -0,0 +1,268 @@
+import base64
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from PIL import Image
+
+class FakeConfig:
+    def __init__(self, latency=0.02, queue_time=1.0, load_time=0.5, image_size=512, failure_rate=0.0, catalog_size=1000):
+        self.latency = latency
+        self.queue_time = queue_time
+        self.load_time = load_time
+        self.image_size = image_size
+        self.failure_rate = failure_rate
+        self.catalog_size = catalog_size
+
+class FakeState:
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.checkpoint = None
+        self.requests = 0
+        self.image = self.render_image()
+        self.image_b64 = base64.b64encode(self.image).decode()
+
+    def render_image(self):
+        size = self.config.image_size
+        image = Image.effect_noise((size, size), 64).convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def new_job(self, **data):
+        job_id = str(uuid.uuid4())
+        with self.lock:
+            self.jobs[job_id] = {'start': time.time(), **data}
+        return job_id
+
+    def job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def progress(self, job):
+        return min((time.time() - job['start']) / max(self.config.queue_time, 1e-6), 1.0)
+
+    def catalog(self, types):
+        return [{'name': f'model_{i:05d}', 'type': types[i % len(types)], 'tags': f'tag{i % 17},style{i % 5}'} for i in range(self.config.catalog_size)]
+
+def image_urls(base_url, n):
+    return [f'{base_url}/images/{i}.png' for i in range(n)]
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    routes = []
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    @property
+    def base_url(self):
+        return f'http://{self.server.server_address[0]}:{self.server.server_address[1]}'
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_bytes(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        return json.loads(self.body) if self.body else None
+
+    def dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = self.rfile.read(length) if length else b''
+        url = urlparse(self.path)
+        with self.state.lock:
+            self.state.requests += 1
+        time.sleep(self.state.config.latency)
+        if not url.path.startswith('/images/') and random.random() < self.state.config.failure_rate:
+            return self.send_json({'message': 'injected failure'}, status=500)
+
+        for route_method, pattern, handler in self.routes:
+            match = re.fullmatch(pattern, url.path)
+            if route_method == method and match:
+                return handler(self, parse_qs(url.query), *match.groups())
+        self.send_json({'message': f'no route for {method} {url.path}'}, status=404)
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    #================================== Shared ==================================
+    def get_image(self, query, index):
+        self.send_bytes(self.state.image, 'image/png')
+
+    #================================== SD.Next ==================================
+    def sdnext_get_options(self, query):
+        self.send_json({'sd_model_checkpoint': self.state.checkpoint})
+
+    def sdnext_set_options(self, query):
+        self.state.checkpoint = (self.read_json() or {}).get('sd_model_checkpoint')
+        self.send_json({})
+
+    def sdnext_reload(self, query):
+        time.sleep(self.state.config.load_time)
+        self.send_json({})
+
+    def sdnext_generate(self, query, mode):
+        payload = self.read_json() or {}
+        n = payload.get('batch_size', 1) * payload.get('n_iter', 1)
+        time.sleep(self.state.config.queue_time)
+        seed = payload.get('seed', 0)
+        info = {'seed': seed, 'all_seeds': [seed + i for i in range(n)], 'all_subseeds': n*[0], 'all_prompts': n*[payload.get('prompt', '')], 'all_negative_prompts': n*[payload.get('negative_prompt', '')], 'infotexts': n*['']}
+        self.send_json({'images': n*[self.state.image_b64], 'parameters': {}, 'info': json.dumps(info)})
+
+    def sdnext_progress(self, query):
+        self.send_json({'progress': 0, 'eta_relative': 0, 'state': {'job': '', 'job_count': 0, 'job_no': 0}, 'current_image': None, 'textinfo': None})
+
+    def sdnext_extra_networks(self, query):
+        self.send_json([{'name': model['name'], 'type': model['type'], 'filename': f"{model['name']}.safetensors", 'preview': '/file=preview.png'} for model in self.state.catalog(['model', 'lora', 'embedding'])])
+
+    #================================== StableHorde ==================================
+    def horde_generate(self, query):
+        payload = self.read_json() or {}
+        self.send_json({'id': self.state.new_job(n=payload.get('params', {}).get('n', 1)), 'kudos': 10})
+
+    def horde_check(self, query, job_id):
+        job = self.state.job(job_id)
+        progress = self.state.progress(job)
+        done = progress >= 1
+        self.send_json({'done': done, 'faulted': False, 'is_possible': True, 'wait_time': int((1 - progress) * self.state.config.queue_time), 'processing': 0 if done else job['n'], 'finished': job['n'] if done else 0, 'waiting': 0})
+
+    def horde_status(self, query, job_id):
+        job = self.state.job(job_id)
+        self.send_json({'done': True, 'generations': [{'img': url, 'seed': str(i)} for i, url in enumerate(image_urls(self.base_url, job['n']))]})
+
+    def horde_models(self, query):
+        self.send_json([{'name': model['name'], 'type': 'image', 'count': 1} for model in self.state.catalog(['checkpoint'])])
+
+    def horde_model_reference(self, query):
+        self.send_json({model['name']: {'nsfw': False, 'description': model['tags'], 'showcases': []} for model in self.state.catalog(['checkpoint'])})
+
+    def horde_interrogate(self, query):
+        payload = self.read_json() or {}
+        self.send_json({'id': self.state.new_job(forms=[form['name'] for form in payload.get('forms', [])])})
+
+    def horde_interrogate_status(self, query, job_id):
+        job = self.state.job(job_id)
+        done = self.state.progress(job) >= 1
+        forms = [{'form': form, 'state': 'done' if done else 'processing', 'result': {form: image_urls(self.base_url, 1)[0]} if done else None} for form in job['forms']]
+        self.send_json({'state': 'done' if done else 'processing', 'forms': forms})
+
+    #================================== NovitaAI ==================================
+    def novita_generate(self, query, mode):
+        payload = self.read_json() or {}
+        self.send_json({'task_id': self.state.new_job(n=payload.get('request', {}).get('image_num', 1))})
+
+    def novita_result(self, query):
+        job = self.state.job(query['task_id'][0])
+        progress = self.state.progress(job)
+        status = 'TASK_STATUS_SUCCEED' if progress >= 1 else 'TASK_STATUS_PROCESSING'
+        images = [{'image_url': url} for url in image_urls(self.base_url, job['n'])] if progress >= 1 else []
+        self.send_json({'task': {'status': status, 'progress_percent': int(progress*100), 'reason': ''}, 'images': images})
+
+    def novita_models(self, query):
+        models = [{'name': model['name'], 'type': model['type'], 'sd_name': f"{model['name']}.safetensors", 'civitai_tags': model['tags'], 'civitai_nsfw': False} for model in self.state.catalog(['checkpoint', 'lora', 'textualinversion'])]
+        self.send_json({'data': {'models': models}})
+
+    #================================== ComfyICU ==================================
+    def comfyicu_run(self, query, workflow_id):
+        self.read_json()
+        self.send_json({'id': self.state.new_job(n=1)})
+
+    def comfyicu_status(self, query, workflow_id, job_id):
+        job = self.state.job(job_id)
+        done = self.state.progress(job) >= 1
+        self.send_json({'status': 'COMPLETED' if done else 'RUNNING', 'output': [{'url': url} for url in image_urls(self.base_url, job['n'])] if done else []})
+
+    def comfyicu_sheet(self, query):
+        types = ['checkpoints', 'loras', 'embeddings']
+        rows = [{'c': [{'v': 'header'}]}] + [{'c': [{'v': 'https://example.com/model'}, {'v': types[i % 3]}, {'v': model['name']}, {'v': f"{model['name']}.safetensors"}]} for i, model in enumerate(self.state.catalog(types))]
+        self.send_bytes(('google.visualization.Query.setResponse(' + json.dumps({'table': {'rows': rows}}) + ');').encode(), 'text/javascript')
+
+FakeProviderHandler.routes = [
+    ('GET', r'/images/(\d+)\.png', FakeProviderHandler.get_image),
+    ('GET', r'/sdapi/v1/options', FakeProviderHandler.sdnext_get_options),
+    ('POST', r'/sdapi/v1/options', FakeProviderHandler.sdnext_set_options),
+    ('POST', r'/sdapi/v1/reload-checkpoint', FakeProviderHandler.sdnext_reload),
+    ('POST', r'/sdapi/v1/(txt2img|img2img)', FakeProviderHandler.sdnext_generate),
+    ('GET', r'/sdapi/v1/progress', FakeProviderHandler.sdnext_progress),
+    ('GET', r'/sdapi/v1/extra-networks', FakeProviderHandler.sdnext_extra_networks),
+    ('POST', r'/v2/generate/async', FakeProviderHandler.horde_generate),
+    ('GET', r'/v2/generate/check/([\w-]+)', FakeProviderHandler.horde_check),
+    ('GET', r'/v2/generate/status/([\w-]+)', FakeProviderHandler.horde_status),
+    ('GET', r'/v2/status/models', FakeProviderHandler.horde_models),
+    ('GET', r'/model-reference\.json', FakeProviderHandler.horde_model_reference),
+    ('POST', r'/v2/interrogate/async', FakeProviderHandler.horde_interrogate),
+    ('GET', r'/v2/interrogate/status/([\w-]+)', FakeProviderHandler.horde_interrogate_status),
+    ('POST', r'/v3/async/(txt2img|img2img|inpainting)', FakeProviderHandler.novita_generate),
+    ('GET', r'/v3/async/task-result', FakeProviderHandler.novita_result),
+    ('GET', r'/v2/models', FakeProviderHandler.novita_models),
+    ('POST', r'/v1/workflows/([\w-]+)/runs', FakeProviderHandler.comfyicu_run),
+    ('GET', r'/v1/workflows/([\w-]+)/runs/([\w-]+)', FakeProviderHandler.comfyicu_status),
+    ('GET', r'/comfyicu-models', FakeProviderHandler.comfyicu_sheet),
+]
+
+class FakeProviderServer:
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), FakeProviderHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = FakeState(config or FakeConfig())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Run the fake remote inference providers')
+    parser.add_argument('--port', type=int, default=7870)
+    parser.add_argument('--queue-time', type=float, default=1.0)
+    parser.add_argument('--image-size', type=int, default=512)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+    with FakeProviderServer(FakeConfig(queue_time=args.queue_time, image_size=args.image_size, failure_rate=args.failure_rate), port=args.port) as server:
+        print(f'Fake providers listening on {server.url}')
+        server.thread.join()
@@ -0,0 +1,181 @@
+# Run from the SD.Next root with the extension installed:
+#   python extensions/sdnext-remote/benchmarks/run_benchmarks.py --services StableHorde NovitaAI --batch 16
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+EXTENSION_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.getcwd(), EXTENSION_DIR, os.path.join(os.getcwd(), 'extensions-builtin', 'Lora')]
+
+from fake_servers import FakeConfig, FakeProviderServer # noqa: E402
+
+def load_extension_script():
+    spec = importlib.util.spec_from_file_location('sdnext_remote_inference', os.path.join(EXTENSION_DIR, 'scripts', 'sdnext_remote_inference.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def setup_extension(server_url, catalog_dir, replay=None, replay_speed=1.0):
+    import modules.shared
+    from extension.utils_remote import RemoteService, imported_scripts
+    import extension.remote_extra_networks
+    import extension.remote_catalog_store
+
+    load_extension_script().on_ui_settings()
+    for key, info in modules.shared.options_templates.items():
+        modules.shared.opts.data.setdefault(key, info.default)
+
+    modules.shared.opts.data['remote_extra_networks_cache_time'] = 0
+    extension.remote_catalog_store.CATALOG_DIR = catalog_dir
+    if replay:
+        modules.shared.opts.data.update({'remote_transport_mode': 'Replay', 'remote_transport_trace': replay, 'remote_transport_replay_speed': replay_speed})
+    else:
+        for service in RemoteService:
+            if service.has_endpoint:
+                modules.shared.opts.data[f'remote_{service.name.lower()}_api_endpoint'] = server_url
+        modules.shared.opts.data['remote_comfyicu_workflow_id'] = 'bench'
+        extension.remote_extra_networks.STABLEHORDE_MODEL_REFERENCE_URL = f'{server_url}/model-reference.json'
+        extension.remote_extra_networks.COMFYICU_MODELS_URL = f'{server_url}/comfyicu-models'
+
+    imported_scripts['controlnet'] = None
+    for name in ['codeformer', 'gfpgan', 'rembg', 'upscale']:
+        imported_scripts[name] = type('ScriptData', (), {'script_class': type(name, (), {})})
+
+def make_txt2img(batch_size, n_iter):
+    import modules.shared
+    from modules.processing import StableDiffusionProcessingTxt2Img
+    from extension.remote_extra_networks import RemoteCheckpointInfo
+    from extension.remote_process import RemoteModel
+
+    checkpoint = RemoteCheckpointInfo('model_00000', filename='model_00000')
+    modules.shared.sd_model = RemoteModel(checkpoint)
+    modules.shared.opts.data['sd_model_checkpoint'] = checkpoint.title
+    return StableDiffusionProcessingTxt2Img(sd_model=modules.shared.sd_model, prompt='benchmark prompt', negative_prompt='', sampler_name='Euler a', steps=20, cfg_scale=7, width=512, height=512, batch_size=batch_size, n_iter=n_iter, do_not_save_samples=True, do_not_save_grid=True)
+
+def bench_generate(service, batch_size, n_iter):
+    from extension.remote_process import generate_images
+    proc = generate_images(service, make_txt2img(batch_size, n_iter))
+    return len(proc.images)
+
+def bench_models(service, catalog_dir=None):
+    from extension.utils_remote import clear_cache_prefix
+    from extension.remote_extra_networks import api_get_catalog
+    clear_cache_prefix(service, 'get_models')
+    if catalog_dir:
+        for name in os.listdir(catalog_dir):
+            os.remove(os.path.join(catalog_dir, name))
+    return sum(len(models) for models in api_get_catalog(service).values())
+
+def bench_postprocess(service):
+    from PIL import Image
+    from modules.scripts_postprocessing import PostprocessedImage
+    from extension.utils_remote import imported_scripts
+    from extension.remote_postprocess import remote_run
+
+    class Runner:
+        def scripts_in_preferred_order(self):
+            script = imported_scripts['upscale'].script_class()
+            script.args_from, script.args_to = 0, 1
+            script.controls = {'upscaler_1_name': None}
+            return [script]
+
+    pp = PostprocessedImage(Image.new('RGB', (512, 512)))
+    remote_run(Runner(), pp, ['RealESRGAN_x4plus'])
+    return 1
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method='inclusive')[q-1] if len(values) > 1 else values[0]
+
+def run_case(name, func, iterations, concurrency):
+    latencies = []
+    failures = 0
+    items = 0
+
+    def timed():
+        start = time.time()
+        count = func()
+        return time.time() - start, count
+
+    tracemalloc.start()
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(timed) for _ in range(iterations)]:
+            try:
+                latency, count = future.result()
+                latencies.append(latency)
+                items += count
+            except Exception as e:
+                failures += 1
+                print(f'{name}: {type(e).__name__}: {e}')
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'case': name,
+        'iterations': iterations,
+        'failures': failures,
+        'items': items,
+        'throughput': items / elapsed if elapsed else 0,
+        'p50': percentile(latencies, 50) if latencies else None,
+        'p99': percentile(latencies, 99) if latencies else None,
+        'peak_mb': peak / 1024**2
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sdnext-remote against local fake providers')
+    parser.add_argument('--services', nargs='+', default=['SDNext', 'StableHorde', 'NovitaAI', 'ComfyICU'])
+    parser.add_argument('--cases', nargs='+', default=['generate', 'models', 'postprocess'])
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=2)
+    parser.add_argument('--batch', type=int, default=4)
+    parser.add_argument('--n-iter', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--queue-time', type=float, default=1.0)
+    parser.add_argument('--load-time', type=float, default=0.5)
+    parser.add_argument('--image-size', type=int, default=512)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--catalog-size', type=int, default=1000)
+    parser.add_argument('--cold-catalog', action='store_true', help='drop the on-disk catalog cache before each models run')
+    parser.add_argument('--replay', default=None, help='serve requests from a recorded trace instead of the fake servers')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='replay speed multiplier, 0 for no delay')
+    parser.add_argument('--output', default=None, help='write results as json to this file')
+    args = parser.parse_args()
+
+    config = FakeConfig(latency=args.latency, queue_time=args.queue_time, load_time=args.load_time, image_size=args.image_size, failure_rate=args.failure_rate, catalog_size=args.catalog_size)
+    with FakeProviderServer(config) as server, tempfile.TemporaryDirectory() as catalog_dir:
+        setup_extension(server.url, catalog_dir, args.replay, args.replay_speed)
+        import modules.shared
+        from extension.utils_remote import RemoteService
+
+        results = []
+        for name in args.services:
+            service = RemoteService[name]
+            modules.shared.opts.data['remote_inference_service'] = name
+            cases = {
+                'generate': lambda: bench_generate(service, args.batch, args.n_iter),
+                'models': lambda: bench_models(service, catalog_dir if args.cold_catalog else None),
+                'postprocess': lambda: bench_postprocess(service)
+            }
+            for case in args.cases:
+                if case == 'postprocess' and service != RemoteService.StableHorde:
+                    continue
+                start_requests = server.state.requests
+                result = run_case(f'{name}:{case}', cases[case], args.iterations, args.concurrency)
+                result['requests'] = server.state.requests - start_requests
+                results.append(result)
+                print(f"{result['case']:<24} ok={result['iterations']-result['failures']:<4} items/s={result['throughput']:<8.2f} p50={result['p50'] or 0:<7.3f} p99={result['p99'] or 0:<7.3f} requests={result['requests']:<6} peak={result['peak_mb']:.1f}MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
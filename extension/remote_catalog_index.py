@@ -0,0 +1,60 @@
+import bisect
+import re
+import threading
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 5000
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+class CatalogIndex:
+    def __init__(self, items):
+        self.items = items
+        postings = {}
+        for position, item in enumerate(items):
+            for token in set(tokenize(item['search_term'])):
+                postings.setdefault(token, []).append(position)
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+
+    def match_prefix(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + '\uffff', start)
+        if end - start == 1:
+            return set(self.postings[start])
+        return {position for postings in self.postings[start:end] for position in postings}
+
+    def search(self, query=''):
+        positions = None
+        for token in sorted(set(tokenize(query)), key=len, reverse=True):
+            matches = self.match_prefix(token)
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                return []
+        return self.items if positions is None else [self.items[position] for position in sorted(positions)]
+
+    def page(self, query='', offset=0, limit=DEFAULT_PAGE_SIZE):
+        matches = self.search(query)
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+        return {'total': len(matches), 'offset': offset, 'items': matches[offset:offset+limit]}
+
+indexes = {}
+versions = {}
+index_lock = threading.Lock()
+
+def bump_version(model_type):
+    with index_lock:
+        versions[model_type] = versions.get(model_type, 0) + 1
+
+def get_index(model_type, build, *key):
+    key = (versions.get(model_type, 0), *key)
+    with index_lock:
+        cached = indexes.get(model_type)
+        if cached and cached[0] == key:
+            return cached[1]
+    index = CatalogIndex(list(build()))
+    with index_lock:
+        indexes[model_type] = (key, index)
+    return index
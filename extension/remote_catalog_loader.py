@@ -0,0 +1,62 @@
+import queue
+import threading
+
+import modules.shared
+
+from extension.utils_remote import RemoteService, get_current_api_service
+
+class CatalogLoader:
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.pending = {}
+        self.loading = set()
+        self.errors = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def start(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self.run, name='RI catalog loader', daemon=True)
+            self.worker.start()
+
+    def request(self, model_type, service, apply):
+        with self.lock:
+            queued = model_type in self.pending
+            self.pending[model_type] = (service, apply)
+            self.loading.add(model_type)
+            self.start()
+        if not queued:
+            self.queue.put(model_type)
+
+    def run(self):
+        while True:
+            model_type = self.queue.get()
+            with self.lock:
+                service, apply = self.pending.pop(model_type)
+            try:
+                apply()
+                with self.lock:
+                    self.errors.pop(model_type, None)
+                    self.generation += 1
+            except Exception as e:
+                modules.shared.log.error(f'RI: Unable to load {model_type.name.lower()}s from {service}: {e}')
+                with self.lock:
+                    self.errors[model_type] = str(e)
+            finally:
+                with self.lock:
+                    if model_type not in self.pending:
+                        self.loading.discard(model_type)
+
+    def status(self):
+        with self.lock:
+            return {
+                'loading': sorted(model_type.name.lower() for model_type in self.loading),
+                'errors': {model_type.name.lower(): error for model_type, error in self.errors.items()},
+                'generation': self.generation
+            }
+
+catalog_loader = CatalogLoader()
+
+def catalog_status():
+    return {**catalog_loader.status(), 'remote': get_current_api_service() != RemoteService.Local}
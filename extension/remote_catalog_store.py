@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+
+import modules.shared
+
+from extension.utils_remote import get_session, get_remote_endpoint, build_header, clear_cache_prefix, RemoteInferenceAPIError
+
+CATALOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'catalogs')
+
+revalidated = {}
+revalidated_lock = threading.Lock()
+
+def entry_paths(url):
+    key = hashlib.sha1(url.encode()).hexdigest()
+    return os.path.join(CATALOG_DIR, f'{key}.json'), os.path.join(CATALOG_DIR, f'{key}.bin')
+
+def load_entry(url):
+    meta_path, body_path = entry_paths(url)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        with open(body_path, 'rb') as f:
+            return meta, f.read()
+    except (OSError, ValueError):
+        return None, None
+
+def write_atomic(path, content, mode='wb'):
+    with open(path + '.tmp', mode) as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+
+def store_entry(url, response):
+    meta_path, body_path = entry_paths(url)
+    meta = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched': time.time()
+    }
+    try:
+        os.makedirs(CATALOG_DIR, exist_ok=True)
+        write_atomic(body_path, response.content)
+        write_atomic(meta_path, json.dumps(meta), mode='w')
+    except OSError as e:
+        modules.shared.log.warning(f'RI: Unable to store catalog {url}: {e}')
+
+def fetch_entry(service, url, headers=None, meta=None):
+    headers = dict(headers or {})
+    if meta and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+
+    response = get_session(service).get(url, headers=headers, timeout=60)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    store_entry(url, response)
+    return response.content
+
+def revalidate(service, url, headers, meta):
+    try:
+        body = fetch_entry(service, url, headers, meta)
+    except requests.RequestException as e:
+        modules.shared.log.warning(f'RI: Unable to refresh catalog {url}: {e}')
+        return
+    if body is not None:
+        modules.shared.log.info(f'RI: Catalog updated from {url}')
+        clear_cache_prefix(service, 'get_models')
+
+def get_catalog(service, url, headers=None):
+    meta, body = load_entry(url)
+    if body is None:
+        with revalidated_lock:
+            revalidated[url] = time.time()
+        try:
+            return fetch_entry(service, url, headers)
+        except requests.RequestException as e:
+            raise RemoteInferenceAPIError(service, e)
+
+    with revalidated_lock:
+        stale = time.time() - revalidated.get(url, 0) > modules.shared.opts.remote_extra_networks_cache_time
+        if stale:
+            revalidated[url] = time.time()
+    if stale:
+        threading.Thread(target=revalidate, args=(service, url, headers, meta), daemon=True).start()
+    return body
+
+def request_catalog(service, path, no_headers=False, endpoint=None):
+    url = (endpoint or get_remote_endpoint(service)) + path
+    try:
+        return json.loads(get_catalog(service, url, None if no_headers else build_header(service)))
+    except ValueError as e:
+        raise RemoteInferenceAPIError(service, e)
@@ -0,0 +1,189 @@
+from collections import OrderedDict
+import copy
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+import modules.shared
+
+from extension.utils_remote import RemoteService, RemoteInferenceProcessError, request_or_error
+from extension.remote_poller import wait_for_job
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+WORKFLOWS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'workflows')
+RECONNECT_DELAY = 5
+FINISHED_LIMIT = 64
+
+#================================== Workflows ==================================
+class WorkflowTemplate:
+    INPUTS = {
+        'ckpt_name': ('CheckpointLoaderSimple', 'ckpt_name'),
+        'seed': ('KSampler', 'seed'),
+        'steps': ('KSampler', 'steps'),
+        'cfg': ('KSampler', 'cfg'),
+        'denoise': ('KSampler', 'denoise'),
+        'width': ('EmptyLatentImage', 'width'),
+        'height': ('EmptyLatentImage', 'height'),
+        'batch_size': ('EmptyLatentImage', 'batch_size')
+    }
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.bindings = {}
+        for node_id, node in graph.items():
+            for name, (class_type, key) in WorkflowTemplate.INPUTS.items():
+                if node['class_type'] == class_type and key in node['inputs']:
+                    self.bindings.setdefault(name, (node_id, key))
+            if node['class_type'] == 'KSampler':
+                for name in ['positive', 'negative']:
+                    self.bindings.setdefault(name, (node['inputs'][name][0], 'text'))
+
+    def instantiate(self, **values):
+        graph = copy.deepcopy(self.graph)
+        for name, value in values.items():
+            if value is not None and name in self.bindings:
+                node_id, key = self.bindings[name]
+                graph[node_id]['inputs'][key] = value
+        return graph
+
+@functools.lru_cache(maxsize=None)
+def load_workflow(name):
+    with open(os.path.join(WORKFLOWS_DIR, f'{name}.json')) as f:
+        return WorkflowTemplate(json.load(f))
+
+#================================== Client ==================================
+class ComfyUIJob:
+    def __init__(self, prompt_id, on_progress=None):
+        self.prompt_id = prompt_id
+        self.on_progress = on_progress
+        self.error = None
+        self.executing = False
+        self.done = threading.Event()
+
+class ComfyUIClient:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.client_id = uuid.uuid4().hex
+        self.jobs = {}
+        self.finished = OrderedDict()
+        self.lock = threading.Lock()
+        self.connected = threading.Event()
+        if websocket is not None:
+            threading.Thread(target=self.run_websocket, name=f'RI ComfyUI websocket {endpoint}', daemon=True).start()
+        else:
+            modules.shared.log.warning('RI: websocket-client is not installed, ComfyUI jobs will be polled')
+
+    def run_websocket(self):
+        url = self.endpoint.replace('http', 'ws', 1) + '/ws?' + urlencode({'clientId': self.client_id})
+        while True:
+            app = websocket.WebSocketApp(url, on_open=lambda ws: self.connected.set(), on_message=self.on_message)
+            app.run_forever()
+            self.connected.clear()
+            with self.lock:
+                for job in self.jobs.values():
+                    job.done.set()
+            time.sleep(RECONNECT_DELAY)
+
+    def on_message(self, _ws, message):
+        if not isinstance(message, str):
+            return
+        message = json.loads(message)
+        data = message.get('data') or {}
+        prompt_id = data.get('prompt_id')
+
+        with self.lock:
+            job = self.jobs.get(prompt_id)
+        if message['type'] == 'progress' and job and job.on_progress:
+            job.on_progress(data['value'], data['max'])
+        elif message['type'] == 'execution_start' and job:
+            job.executing = True
+        elif (message['type'] == 'executing' and data.get('node') is None) or message['type'] == 'execution_success':
+            self.finish(prompt_id)
+        elif message['type'] == 'execution_error':
+            self.finish(prompt_id, data.get('exception_message', 'execution error'))
+
+    def finish(self, prompt_id, error=None):
+        with self.lock:
+            job = self.jobs.get(prompt_id)
+            if job is None:
+                if prompt_id not in self.finished or error is not None:
+                    self.finished[prompt_id] = error
+                while len(self.finished) > FINISHED_LIMIT:
+                    self.finished.popitem(last=False)
+                return
+            if job.done.is_set():
+                return
+            job.error = error
+            job.done.set()
+
+    def submit(self, graph, on_progress=None):
+        response = request_or_error(RemoteService.ComfyUI, '/prompt', method='POST', data={'prompt': graph, 'client_id': self.client_id}, endpoint=self.endpoint)
+        if response.get('node_errors'):
+            raise RemoteInferenceProcessError(RemoteService.ComfyUI, f"Invalid workflow: {response['node_errors']}")
+
+        job = ComfyUIJob(response['prompt_id'], on_progress)
+        with self.lock:
+            self.jobs[job.prompt_id] = job
+            if job.prompt_id in self.finished:
+                job.error = self.finished.pop(job.prompt_id)
+                job.done.set()
+        return job
+
+    def running_prompt(self):
+        queue = request_or_error(RemoteService.ComfyUI, '/queue', endpoint=self.endpoint)
+        return next((item[1] for item in queue.get('queue_running', [])), None)
+
+    def cancel(self, job):
+        request_or_error(RemoteService.ComfyUI, '/queue', method='POST', data={'delete': [job.prompt_id]}, endpoint=self.endpoint)
+        if job.executing or self.running_prompt() == job.prompt_id:
+            request_or_error(RemoteService.ComfyUI, '/interrupt', method='POST', data={'prompt_id': job.prompt_id}, endpoint=self.endpoint)
+
+    def poll_history(self, job):
+        def poll(poll_job):
+            history = request_or_error(RemoteService.ComfyUI, f'/history/{job.prompt_id}', endpoint=self.endpoint)
+            if job.prompt_id in history:
+                return True, history[job.prompt_id], None
+            return False, None, 1
+        return wait_for_job(RemoteService.ComfyUI, job.prompt_id, poll, on_cancel=lambda: self.cancel(job))
+
+    def wait(self, job):
+        try:
+            while self.connected.is_set() and not job.done.wait(1):
+                if modules.shared.state.interrupted:
+                    self.cancel(job)
+                    raise InterruptedError(f'RI: ComfyUI job {job.prompt_id} cancelled')
+            if job.error:
+                raise RemoteInferenceProcessError(RemoteService.ComfyUI, f'Generation failed: {job.error}')
+            return self.poll_history(job)
+        finally:
+            with self.lock:
+                self.jobs.pop(job.prompt_id, None)
+
+    def output_urls(self, history):
+        return [
+            f'{self.endpoint}/view?' + urlencode({'filename': image['filename'], 'subfolder': image.get('subfolder', ''), 'type': image.get('type', 'output')})
+            for output in history.get('outputs', {}).values()
+            for image in output.get('images', [])
+        ]
+
+clients = {}
+clients_lock = threading.Lock()
+def get_client(endpoint):
+    with clients_lock:
+        if endpoint not in clients:
+            clients[endpoint] = ComfyUIClient(endpoint)
+            clients[endpoint].connected.wait(2)
+        return clients[endpoint]
+
+def run_prompt(endpoint, graph, on_progress=None):
+    client = get_client(endpoint)
+    job = client.submit(graph, on_progress)
+    return client.output_urls(client.wait(job))
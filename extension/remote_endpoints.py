@@ -0,0 +1,131 @@
+from contextlib import contextmanager
+import threading
+import time
+import requests
+
+import modules.shared
+
+HEALTH_CHECK_INTERVAL = 15
+FAILURE_THRESHOLD = 2
+LATENCY_SMOOTHING = 0.3
+
+def sdnext_queue(response):
+    state = response.get('state') or {}
+    return max(state.get('job_count', 0) - state.get('job_no', 0), 1) if state.get('job') else 0
+
+def comfyui_queue(response):
+    return (response.get('exec_info') or {}).get('queue_remaining', 0)
+
+QUEUE_PROBES = {
+    'SDNext': ('/sdapi/v1/progress?skip_current_image=true', sdnext_queue),
+    'ComfyUI': ('/prompt', comfyui_queue)
+}
+
+def is_node_failure(e):
+    status_code = getattr(e, 'status_code', None)
+    if status_code is not None:
+        return status_code >= 500
+    return isinstance(getattr(e, 'error', e), (requests.ConnectionError, requests.Timeout))
+
+class EndpointNode:
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.failures = 0
+        self.in_flight = 0
+        self.queue = 0
+        self.latency = None
+        self.probe_latency = None
+
+    def load(self):
+        return (self.in_flight + self.queue, self.latency or 0, self.probe_latency or 0)
+
+    def observe_latency(self, elapsed):
+        self.latency = smooth(self.latency, elapsed)
+
+    def observe_probe_latency(self, elapsed):
+        self.probe_latency = smooth(self.probe_latency, elapsed)
+
+def smooth(average, value):
+    return value if average is None else (1-LATENCY_SMOOTHING)*average + LATENCY_SMOOTHING*value
+
+class EndpointPool:
+    def __init__(self, service, urls, get_session):
+        self.service = service
+        self.urls = urls
+        self.nodes = [EndpointNode(url) for url in urls]
+        self.lock = threading.Lock()
+        self.get_session = get_session
+        self.stopped = threading.Event()
+        if len(self.nodes) > 1 and service.name in QUEUE_PROBES:
+            threading.Thread(target=self.run_health_checks, name=f'RI {service.name} health checks', daemon=True).start()
+
+    def pick(self):
+        with self.lock:
+            nodes = [node for node in self.nodes if node.healthy] or self.nodes
+            return min(nodes, key=EndpointNode.load)
+
+    @contextmanager
+    def acquire(self):
+        node = self.pick()
+        with self.lock:
+            node.in_flight += 1
+        start = time.time()
+        try:
+            yield node.url
+        except Exception as e:
+            if is_node_failure(e):
+                self.record_failure(node)
+            raise
+        else:
+            with self.lock:
+                node.failures = 0
+                node.observe_latency(time.time() - start)
+        finally:
+            with self.lock:
+                node.in_flight -= 1
+
+    def record_failure(self, node):
+        with self.lock:
+            node.failures += 1
+            if node.healthy and node.failures >= FAILURE_THRESHOLD and len(self.nodes) > 1:
+                node.healthy = False
+                modules.shared.log.warning(f'RI: {self.service} endpoint {node.url} removed from rotation')
+
+    def check_health(self, node):
+        path, parse_queue = QUEUE_PROBES[self.service.name]
+        start = time.time()
+        try:
+            response = self.get_session(self.service).get(node.url + path, timeout=5)
+            response.raise_for_status()
+            queue = parse_queue(response.json())
+        except (requests.RequestException, ValueError, AttributeError, TypeError):
+            self.record_failure(node)
+            return
+
+        with self.lock:
+            node.queue = queue
+            node.observe_probe_latency(time.time() - start)
+            node.failures = 0
+            if not node.healthy:
+                node.healthy = True
+                modules.shared.log.info(f'RI: {self.service} endpoint {node.url} back in rotation')
+
+    def run_health_checks(self):
+        while not self.stopped.wait(HEALTH_CHECK_INTERVAL):
+            for node in self.nodes:
+                self.check_health(node)
+
+    def stop(self):
+        self.stopped.set()
+
+pools = {}
+pools_lock = threading.Lock()
+def get_pool(service, urls, get_session):
+    with pools_lock:
+        pool = pools.get(service)
+        if pool is None or pool.urls != urls:
+            if pool is not None:
+                pool.stop()
+            pool = pools[service] = EndpointPool(service, urls, get_session)
+        return pool
@@ -1,17 +1,25 @@
 import json
 import html
-import requests
-
+import sys
+import threading
 import modules.shared
 import modules.sd_models
 import modules.textual_inversion
 import modules.sd_hijack
 import modules.ui_extra_networks
+from fastapi import HTTPException
 from modules.shared import log
 import network
 import networks
 
-from extension.utils_remote import ModelType, RemoteService, get_current_api_service, get_remote_endpoint, safeget, request_or_error, get_cache_or_run
+from extension.utils_remote import ModelType, RemoteService, get_current_api_service, get_remote_endpoint, safeget, get_cache_or_run, is_cached
+from extension.remote_catalog_store import get_catalog, request_catalog
+from extension.remote_previews import proxy_preview
+from extension.remote_catalog_loader import catalog_loader
+from extension.remote_catalog_index import bump_version, get_index
+
+STABLEHORDE_MODEL_REFERENCE_URL = 'https://raw.githubusercontent.com/Haidra-Org/AI-Horde-image-model-reference/main/stable_diffusion.json'
+COMFYICU_MODELS_URL = 'https://docs.google.com/spreadsheets/d/1uKTAaD6l1tc5uMBy4EdoN1TL_07Txavjmw2IhUdlUtQ/gviz/tq?tqx=out:json'
 
 def log_debug_model_list(model_type, api_service):
     log.info(f'RI: Listing {model_type.name.lower()}s from {api_service}')
@@ -19,16 +27,118 @@ def log_debug_model_list(model_type, api_service):
 def log_info_model_count(model_type, api_service, count):
     log.info(f'Available {model_type.name.lower()}s: {api_service} items={count}')
 
+STABLEHORDE_MODELS = {
+    ModelType.SAMPLER: {"LMS": "k_lms", "Heun": "k_heun", "Euler": "k_euler", "Euler a": "k_euler_a", "DPM2": "k_dpm_2", "DPM2 a": "k_dpm_2_a", "DPM fast": "k_dpm_fast", "DPM adaptive": "k_dpm_adaptive", "DPM++ 2S a": "k_dpmpp_2s_a", "DPM++ 2M": "k_dpmpp_2m", "DPM solver": "dpmsolver", "DPM++ SDE": "k_dpmpp_sde", "DDIM": "DDIM"},
+    ModelType.UPSCALER: ['RealESRGAN_x2plus', 'RealESRGAN_x4plus', 'RealESRGAN_x4plus_anime_6B', 'NMKD_Siax', '4x_AnimeSharp'],
+    ModelType.CONTROLNET: ["canny", "hed", "depth", "normal", "openpose", "seg", "scribble", "fakescribbles", "hough"]
+}
+CATALOG_TYPES = [ModelType.CHECKPOINT, ModelType.LORA, ModelType.EMBEDDING]
+
 def get_models(model_type: ModelType, service: RemoteService):
-    runnable = lambda: api_get_models(service)
-    cache_time = modules.shared.opts.remote_balance_cache_time
-    return get_cache_or_run(service, 'get_models', runnable, cache_time)[model_type]
+    runnable = lambda: api_get_models(service, model_type)
+    cache_time = modules.shared.opts.remote_extra_networks_cache_time
+    return get_cache_or_run(service, f'get_models/{model_type.name}', runnable, cache_time)
+
+def models_cached(model_type: ModelType, service: RemoteService):
+    return is_cached(service, f'get_models/{model_type.name}', modules.shared.opts.remote_extra_networks_cache_time)
+
+def api_get_models(service: RemoteService, model_type: ModelType):
+    if service == RemoteService.StableHorde and model_type in STABLEHORDE_MODELS:
+        return STABLEHORDE_MODELS[model_type]
+    if model_type not in CATALOG_TYPES:
+        return []
+
+    runnable = lambda: api_get_catalog(service)
+    cache_time = modules.shared.opts.remote_extra_networks_cache_time
+    return get_cache_or_run(service, 'get_models/catalog', runnable, cache_time)[model_type]
+
+class LazyRemoteModel:
+    __slots__ = ('entry', 'model')
+
+    def __init__(self, entry):
+        object.__setattr__(self, 'entry', entry)
+        object.__setattr__(self, 'model', None)
+
+    @property
+    def __class__(self):
+        return remote_model_classes[self.entry.model_type]
+
+    def materialize(self):
+        if self.model is None:
+            object.__setattr__(self, 'model', self.entry.materialize())
+        return self.model
+
+    def __getattr__(self, name):
+        return getattr(self.materialize(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.materialize(), name, value)
+
+registered_services = {}
+remote_entries = {model_type: {} for model_type in CATALOG_TYPES}
+sync_locks = {model_type: threading.Lock() for model_type in CATALOG_TYPES}
+def sync_models(model_type: ModelType, service: RemoteService, registry, clear, register, unregister):
+    entries = {entry.name: entry for entry in get_models(model_type, service)}
+    with sync_locks[model_type]:
+        current = remote_entries[model_type]
+        if registered_services.get(model_type) != service or any(type(model) is not LazyRemoteModel for model in list(registry.values())):
+            clear()
+            current.clear()
+            registered_services[model_type] = service
+            removed = None
+        else:
+            removed = [entry for name, entry in list(current.items()) if entry != entries.get(name)]
+            for entry in removed:
+                del current[entry.name]
+                model = registry.get(entry.name)
+                if model is not None:
+                    unregister(model)
+
+        added = {name: LazyRemoteModel(entry) for name, entry in entries.items() if name not in current or name not in registry}
+        register(added)
+        current.update((name, model.entry) for name, model in added.items())
+        if removed is None or removed or added:
+            bump_version(model_type)
+
+def load_models(model_type: ModelType, service: RemoteService, registry, clear, register, unregister):
+    def apply():
+        log_debug_model_list(model_type, service)
+        sync_models(model_type, service, registry, clear, register, unregister)
+        log_info_model_count(model_type, service, len(registry))
+
+    if models_cached(model_type, service):
+        apply()
+    else:
+        catalog_loader.request(model_type, service, apply)
+
+def load_remote_catalogs():
+    if get_current_api_service() != RemoteService.Local:
+        list_remote_models()
+        list_remote_loras()
+        list_remote_embeddings(modules.sd_hijack.model_hijack.embedding_db)
+
+class RemoteModelEntry:
+    __slots__ = ('model_type', 'name', 'preview', 'description', 'filename', 'tags')
+
+    def __init__(self, model_type: ModelType, name, preview_url=None, description=None, filename='', tags=()):
+        self.model_type = model_type
+        self.name = name
+        self.preview = preview_url
+        self.description = description
+        self.filename = filename
+        self.tags = tuple(sys.intern(tag.strip()) for tag in tags if tag.strip())
+
+    def __eq__(self, other):
+        return isinstance(other, RemoteModelEntry) and all(getattr(self, key) == getattr(other, key) for key in RemoteModelEntry.__slots__)
 
-def register_models(model_type: ModelType, service: RemoteService):
-    for model in get_models(model_type, service):
-        model.register()
+    __hash__ = None
 
-def new_remote_model(model_type: ModelType, name, preview_url=None, description=None, info=None, filename='', tags={}):
+    def materialize(self):
+        model = new_remote_model(self.model_type, self.name, self.preview, self.description, filename=self.filename, tags=self.tags)
+        model.entry = self
+        return model
+
+def new_remote_model(model_type: ModelType, name, preview_url=None, description=None, info=None, filename='', tags=()):
     if model_type == ModelType.CHECKPOINT:
         return RemoteCheckpointInfo(name, preview_url, description, info, filename, tags)
     elif model_type == ModelType.LORA:
@@ -36,16 +146,17 @@ def new_remote_model(model_type: ModelType, name, preview_url=None, description=
     elif model_type == ModelType.EMBEDDING:
         return RemoteEmbedding(name, preview_url, description, info, filename, tags)
 
-def api_get_models(service: RemoteService):
-    output_lists = {model_type: [] for model_type in ModelType}
+def api_get_catalog(service: RemoteService):
+    output_lists = {model_type: [] for model_type in CATALOG_TYPES}
 
     #================================== SD.Next ==================================
     if service == RemoteService.SDNext:
-        model_list = request_or_error(service, "/sdapi/v1/extra-networks", no_headers=True)
+        endpoint = get_remote_endpoint(service)
+        model_list = request_catalog(service, "/sdapi/v1/extra-networks", no_headers=True, endpoint=endpoint)
         for model in model_list:
             model.update({
                 'name': model['name'].split('\\')[-1],
-                'preview': get_remote_endpoint(RemoteService.SDNext) + model['preview'][1:]
+                'preview': endpoint + model['preview'][1:]
             })
         model_list = sorted(model_list, key=lambda model: str.lower(model['name']))
 
@@ -58,32 +169,27 @@ def api_get_models(service: RemoteService):
             if not current_type:
                 continue
 
-            current_model = new_remote_model(current_type, model['name'], model['preview'], filename=model['filename'])
+            current_model = RemoteModelEntry(current_type, model['name'], model['preview'], filename=model['filename'])
             output_lists[current_type].append(current_model)
 
     #================================== StableHorde ==================================
     elif service == RemoteService.StableHorde:
-        model_list = request_or_error(service, "/v2/status/models", no_headers=True)
+        model_list = request_catalog(service, "/v2/status/models", no_headers=True)
         model_list = filter(lambda model: model['type'] == 'image', model_list)
         
-        data = json.loads(requests.get('https://raw.githubusercontent.com/Haidra-Org/AI-Horde-image-model-reference/main/stable_diffusion.json').content)
+        data = json.loads(get_catalog(service, STABLEHORDE_MODEL_REFERENCE_URL))
 
         checkpoints = []
         for model in sorted(model_list, key=lambda model: (-model['count'], model['name'])):
             model_data = safeget(data, model['name'])
             if not safeget(model_data, 'nsfw') or modules.shared.opts.remote_show_nsfw_models: 
-                checkpoints.append(RemoteCheckpointInfo(f"{model['name']} ({model['count']})", safeget(model_data,'showcases',0), safeget(model_data,'description'), filename=model['name']))
+                checkpoints.append(RemoteModelEntry(ModelType.CHECKPOINT, f"{model['name']} ({model['count']})", safeget(model_data,'showcases',0), safeget(model_data,'description'), filename=model['name']))
 
-        output_lists.update({
-            ModelType.CHECKPOINT: checkpoints,
-            ModelType.SAMPLER: {"LMS": "k_lms", "Heun": "k_heun", "Euler": "k_euler", "Euler a": "k_euler_a", "DPM2": "k_dpm_2", "DPM2 a": "k_dpm_2_a", "DPM fast": "k_dpm_fast", "DPM adaptive": "k_dpm_adaptive", "DPM++ 2S a": "k_dpmpp_2s_a", "DPM++ 2M": "k_dpmpp_2m", "DPM solver": "dpmsolver", "DPM++ SDE": "k_dpmpp_sde", "DDIM": "DDIM"},
-            ModelType.UPSCALER: ['RealESRGAN_x2plus', 'RealESRGAN_x4plus', 'RealESRGAN_x4plus_anime_6B', 'NMKD_Siax', '4x_AnimeSharp'], 
-            ModelType.CONTROLNET: ["canny", "hed", "depth", "normal", "openpose", "seg", "scribble", "fakescribbles", "hough"]
-        })
+        output_lists[ModelType.CHECKPOINT] = checkpoints
 
     #================================== NovitaAI ==================================
     elif service == RemoteService.NovitaAI:
-        model_list = request_or_error(service, "/v2/models", no_headers=True)
+        model_list = request_catalog(service, "/v2/models", no_headers=True)
         model_list = model_list['data']['models']
         for model in model_list:
             model.update({'name': model['name'].lstrip()})
@@ -103,13 +209,13 @@ def api_get_models(service: RemoteService):
             if not current_type:
                 continue
             
-            tags = {tag:0 for tag in model['civitai_tags'].split(',')} if 'civitai_tags' in model else {}
-            current_model = new_remote_model(current_type, model['name'], safeget(model, 'civitai_images', 0, 'url'), filename=model['sd_name'], tags=tags)
+            tags = model['civitai_tags'].split(',') if model.get('civitai_tags') else ()
+            current_model = RemoteModelEntry(current_type, model['name'], safeget(model, 'civitai_images', 0, 'url'), filename=model['sd_name'], tags=tags)
             output_lists[current_type].append(current_model)
     
     #================================== ComfyICU ==================================
     elif service == RemoteService.ComfyICU:
-        data = requests.get("https://docs.google.com/spreadsheets/d/1uKTAaD6l1tc5uMBy4EdoN1TL_07Txavjmw2IhUdlUtQ/gviz/tq?tqx=out:json").content
+        data = get_catalog(service, COMFYICU_MODELS_URL)
         data = (lambda s: s[s.find('(')+1:s.rfind(')')])(str(data))
         data = json.loads(data)
 
@@ -140,23 +246,26 @@ def api_get_models(service: RemoteService):
             if not current_type:
                 continue
             
-            current_model = new_remote_model(current_type, model['filename'].rsplit('.', 1)[0], model['image'], filename=model['filename'])
+            current_model = RemoteModelEntry(current_type, model['filename'].rsplit('.', 1)[0], model['image'], filename=model['filename'])
             output_lists[current_type].append(current_model)
 
     return output_lists
 
         
+def entry_preview(entry):
+    return proxy_preview(entry.preview) or PreviewDescriptionInfo.no_preview
+
 class PreviewDescriptionInfo():
     no_preview = modules.ui_extra_networks.ExtraNetworksPage.link_preview(None, 'html/card-no-preview.png')
 
     def __init__(self, preview_url=None, description=None, info=None):
-        self.preview = preview_url or PreviewDescriptionInfo.no_preview
+        self.preview = proxy_preview(preview_url) or PreviewDescriptionInfo.no_preview
         self.description = description
         self.info = info
 
 #============================================= CHECKPOINTS =============================================
 class RemoteCheckpointInfo(modules.sd_models.CheckpointInfo, PreviewDescriptionInfo):
-    def __init__(self, name, preview_url=None, description=None, info=None, filename='', tags={}):
+    def __init__(self, name, preview_url=None, description=None, info=None, filename='', tags=()):
         PreviewDescriptionInfo.__init__(self, preview_url, description, info)
 
         self.name = self.name_for_extra = self.model_name = self.title = name
@@ -170,36 +279,46 @@ class RemoteCheckpointInfo(modules.sd_models.CheckpointInfo, PreviewDescriptionI
 
         self.tags = tags
 
-def list_remote_models():
-    api_service = get_current_api_service()
-
+def clear_remote_models():
     modules.sd_models.checkpoints_list.clear()
     modules.sd_models.checkpoint_aliases.clear()
 
-    log_debug_model_list(ModelType.CHECKPOINT, api_service)
-    register_models(ModelType.CHECKPOINT, api_service)
-    log_info_model_count(ModelType.CHECKPOINT, api_service, len(modules.sd_models.checkpoints_list))
+def register_remote_models(checkpoints):
+    modules.sd_models.checkpoints_list.update(checkpoints)
+    modules.sd_models.checkpoint_aliases.update(checkpoints)
 
-def extra_networks_checkpoints_list_items(self):
-    for name, checkpoint in modules.sd_models.checkpoints_list.items():
+def unregister_remote_model(checkpoint):
+    modules.sd_models.checkpoints_list.pop(checkpoint.entry.name, None)
+    modules.sd_models.checkpoint_aliases.pop(checkpoint.entry.name, None)
+
+def list_remote_models():
+    api_service = get_current_api_service()
+
+    load_models(ModelType.CHECKPOINT, api_service, modules.sd_models.checkpoints_list, clear_remote_models, register_remote_models, unregister_remote_model)
+
+def checkpoint_cards():
+    for name, entry in list(remote_entries[ModelType.CHECKPOINT].items()):
         yield {
             "type": 'Model',
             "name": name,
-            "title": checkpoint.title,
-            "filename": checkpoint.filename,
+            "title": name,
+            "filename": entry.filename,
             "hash": None,
-            "search_term": name + ' '.join(checkpoint.tags),
-            "preview": checkpoint.preview,
+            "search_term": name + ' ' + ' '.join(entry.tags),
+            "preview": entry_preview(entry),
             "local_preview": None,
-            "description": checkpoint.description,
-            "info": checkpoint.info,
-            "metadata": checkpoint.metadata,
+            "description": entry.description,
+            "info": None,
+            "metadata": {},
             "onclick": '"' + html.escape(f"""return selectCheckpoint({json.dumps(name)})""") + '"',
         }
 
+def extra_networks_checkpoints_list_items(self):
+    return page_items(catalog_cards[ModelType.CHECKPOINT]())
+
 #============================================= LORAS =============================================       
 class RemoteLora(network.NetworkOnDisk, PreviewDescriptionInfo):
-    def __init__(self, name, preview_url=None, description=None, info=None, filename='', tags={}):
+    def __init__(self, name, preview_url=None, description=None, info=None, filename='', tags=()):
         PreviewDescriptionInfo.__init__(self, preview_url, description, info)
 
         self.name = name
@@ -211,57 +330,73 @@ class RemoteLora(network.NetworkOnDisk, PreviewDescriptionInfo):
         self.metadata = {}
         self.hash = self.shorthash = None
 
-    def register(self):
-        networks.available_networks[self.name] = self
-        if self.alias in networks.available_network_aliases:
-            networks.forbidden_network_aliases[self.alias.lower()] = 1
-        networks.available_network_aliases[self.name] = self
-        networks.available_network_aliases[self.alias] = self
-
-def list_remote_loras():
-    api_service = get_current_api_service()
-
+def clear_remote_loras():
     networks.available_networks.clear()
     networks.available_network_aliases.clear()
     networks.forbidden_network_aliases.clear()
     networks.available_network_hash_lookup.clear()
     networks.forbidden_network_aliases.update({"none": 1, "Addams": 1})
 
-    log_debug_model_list(ModelType.LORA, api_service)
-    register_models(ModelType.LORA, api_service)
-    log_info_model_count(ModelType.LORA, api_service, len(networks.available_networks))
+def register_remote_loras(remote_loras):
+    aliases = {}
+    for remote_lora in remote_loras.values():
+        alias = remote_lora.entry.filename
+        if alias in networks.available_network_aliases or alias in aliases or remote_loras.get(alias, remote_lora) is not remote_lora:
+            networks.forbidden_network_aliases[alias.lower()] = 1
+        aliases[alias] = remote_lora
+    networks.available_networks.update(remote_loras)
+    networks.available_network_aliases.update(remote_loras)
+    networks.available_network_aliases.update(aliases)
+
+def unregister_remote_lora(remote_lora):
+    networks.available_networks.pop(remote_lora.entry.name, None)
+    for alias in [remote_lora.entry.name, remote_lora.entry.filename]:
+        if networks.available_network_aliases.get(alias) is remote_lora:
+            del networks.available_network_aliases[alias]
 
-def extra_networks_loras_list_items(self):
-    for name, remote_lora in networks.available_networks.items():
-        prompt = f" <lora:{remote_lora.filename}:{modules.shared.opts.extra_networks_default_multiplier}>"
+def list_remote_loras():
+    api_service = get_current_api_service()
+
+    load_models(ModelType.LORA, api_service, networks.available_networks, clear_remote_loras, register_remote_loras, unregister_remote_lora)
+
+def lora_cards():
+    multiplier = modules.shared.opts.extra_networks_default_multiplier
+    for name, entry in list(remote_entries[ModelType.LORA].items()):
+        prompt = f" <lora:{entry.filename}:{multiplier}>"
         prompt = json.dumps(prompt)
 
         yield {
             "type": 'Lora',
             "name": name,
-            "filename": remote_lora.filename,
+            "filename": entry.filename,
             "hash": None,
-            "search_term": name + ' '.join(remote_lora.tags),
-            "preview": remote_lora.preview,
-            "description": remote_lora.description,
-            "info": remote_lora.info,
+            "search_term": name + ' ' + ' '.join(entry.tags),
+            "preview": entry_preview(entry),
+            "description": entry.description,
+            "info": None,
             "prompt": prompt,
             "local_preview": None,
-            "metadata": remote_lora.metadata,
-            "tags": remote_lora.tags,
+            "metadata": {},
+            "tags": dict.fromkeys(entry.tags, 0),
         }
 
+def extra_networks_loras_list_items(self):
+    return page_items(catalog_cards[ModelType.LORA]())
+
 #============================================= EMBEDDINGS =============================================
 class RemoteEmbedding(modules.textual_inversion.textual_inversion.Embedding, PreviewDescriptionInfo):
-    def __init__(self, name, preview_url=None, description=None, info=None, filename='', tags={}):
+    def __init__(self, name, preview_url=None, description=None, info=None, filename='', tags=()):
         super().__init__(None, name)
         PreviewDescriptionInfo.__init__(self, preview_url, description, info)
 
         self.filename = filename
         self.tags = tags
 
-    def register(self):
-        modules.sd_hijack.model_hijack.embedding_db.word_embeddings[self.name] = self
+remote_model_classes = {
+    ModelType.CHECKPOINT: RemoteCheckpointInfo,
+    ModelType.LORA: RemoteLora,
+    ModelType.EMBEDDING: RemoteEmbedding
+}
 
 def extra_networks_textual_inversions_refresh(self):
     modules.sd_hijack.model_hijack.embedding_db.load_textual_inversion_embeddings()
@@ -269,30 +404,67 @@ def extra_networks_textual_inversions_refresh(self):
 def list_remote_embeddings(self, force_reload=False):
     api_service = get_current_api_service()
 
-    self.ids_lookup.clear()
-    self.word_embeddings.clear()
-    self.skipped_embeddings.clear()
-    self.embeddings_used.clear()
-    self.expected_shape = None
-    self.embedding_dirs.clear()
+    def clear_remote_embeddings():
+        self.ids_lookup.clear()
+        self.word_embeddings.clear()
+        self.skipped_embeddings.clear()
+        self.embeddings_used.clear()
+        self.expected_shape = None
+        self.embedding_dirs.clear()
 
-    log_debug_model_list(ModelType.EMBEDDING, api_service)
-    register_models(ModelType.EMBEDDING, api_service)
-    log_info_model_count(ModelType.EMBEDDING, api_service, len(self.word_embeddings))
+    load_models(ModelType.EMBEDDING, api_service, self.word_embeddings, clear_remote_embeddings, self.word_embeddings.update, lambda embedding: self.word_embeddings.pop(embedding.entry.name, None))
 
-def extra_networks_textual_inversions_list_items(self):
-    for name, embedding in modules.sd_hijack.model_hijack.embedding_db.word_embeddings.items():
-        prompt = json.dumps(f" embedding:{embedding.filename}")
+def embedding_cards():
+    for name, entry in list(remote_entries[ModelType.EMBEDDING].items()):
+        prompt = json.dumps(f" embedding:{entry.filename}")
 
         yield {
             "type": 'Embedding',
             "name": name,
-            "filename": embedding.filename,
-            "preview": embedding.preview,
-            "description": embedding.description,
-            "info": embedding.info,
-            "search_term": name + ' '.join(embedding.tags),
+            "filename": entry.filename,
+            "preview": entry_preview(entry),
+            "description": entry.description,
+            "info": None,
+            "search_term": name + ' ' + ' '.join(entry.tags),
             "prompt": prompt,
             "local_preview": None,
-            "tags": embedding.tags,
+            "tags": dict.fromkeys(entry.tags, 0),
         }
+
+def extra_networks_textual_inversions_list_items(self):
+    return page_items(catalog_cards[ModelType.EMBEDDING]())
+
+#============================================= SEARCH =============================================
+catalog_cards = {
+    ModelType.CHECKPOINT: lambda: get_index(ModelType.CHECKPOINT, checkpoint_cards),
+    ModelType.LORA: lambda: get_index(ModelType.LORA, lora_cards, modules.shared.opts.extra_networks_default_multiplier),
+    ModelType.EMBEDDING: lambda: get_index(ModelType.EMBEDDING, embedding_cards)
+}
+
+network_pages = {
+    'checkpoints': (ModelType.CHECKPOINT, 'ExtraNetworksPageCheckpoints'),
+    'loras': (ModelType.LORA, 'ExtraNetworksPageLora'),
+    'embeddings': (ModelType.EMBEDDING, 'ExtraNetworksPageTextualInversion')
+}
+
+def page_items(index):
+    return iter(index.page('', 0, modules.shared.opts.remote_extra_networks_page_size)['items'])
+
+def api_network_cards(kind: str, tabname: str = 'txt2img', query: str = '', offset: int = 0):
+    if kind not in network_pages:
+        raise HTTPException(status_code=404, detail='Unknown network type')
+    if get_current_api_service() == RemoteService.Local:
+        return {'remote': False}
+
+    model_type, page_class = network_pages[kind]
+    page = next((page for page in modules.ui_extra_networks.extra_pages if type(page).__name__ == page_class), None)
+    limit = modules.shared.opts.remote_extra_networks_page_size
+    result = catalog_cards[model_type]().page(query, max(offset, 0), limit)
+    return {
+        'remote': True,
+        'total': result['total'],
+        'offset': result['offset'],
+        'limit': limit,
+        'cards_id': f"{tabname}_{page.name.replace(' ', '_')}_cards" if page else None,
+        'html': ''.join(page.create_html(item, tabname) for item in result['items']) if page else ''
+    }
@@ -0,0 +1,94 @@
+import re
+import threading
+
+from fastapi.responses import PlainTextResponse
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+ID_PATTERN = re.compile(r'/(?:[0-9a-fA-F-]{16,}|\d+)(?=/|$)')
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in items) + '}' if items else ''
+
+def normalize_path(path):
+    return ID_PATTERN.sub('/{id}', path.split('?')[0])
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        with self.lock:
+            return self.header() + [f'{self.name}{format_labels(key)} {value}' for key, value in self.values.items()]
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total, observations = self.values.get(key, (len(self.buckets)*[0], 0, 0))
+            counts = [count + (value <= bound) for count, bound in zip(counts, self.buckets)]
+            self.values[key] = (counts, total + value, observations + 1)
+
+    def render(self):
+        lines = self.header()
+        with self.lock:
+            for key, (counts, total, observations) in self.values.items():
+                for count, bound in zip(counts, self.buckets):
+                    lines.append(f'{self.name}_bucket{format_labels(key, ("le", bound))} {count}')
+                lines.append(f'{self.name}_bucket{format_labels(key, ("le", "+Inf"))} {observations}')
+                lines.append(f'{self.name}_sum{format_labels(key)} {total}')
+                lines.append(f'{self.name}_count{format_labels(key)} {observations}')
+        return lines
+
+class CollectedMetric(Metric):
+    def __init__(self, name, documentation, collect, kind='gauge'):
+        super().__init__(name, documentation)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        return self.header() + [f'{self.name}{format_labels(sorted(labels.items()))} {value}' for labels, value in self.collect()]
+
+registry = []
+
+request_duration = Histogram('ri_request_duration_seconds', 'Remote API request latency by service and path')
+job_polls = Histogram('ri_job_polls', 'Status polls needed per remote job', COUNT_BUCKETS)
+queue_wait = Histogram('ri_queue_wait_seconds', 'Time remote jobs spent queued before running')
+job_duration = Histogram('ri_job_duration_seconds', 'Time from job submission to completion')
+download_duration = Histogram('ri_download_duration_seconds', 'Result image download time by host')
+download_bytes = Counter('ri_download_bytes_total', 'Result image bytes downloaded by host')
+errors = Counter('ri_errors_total', 'Remote inference errors surfaced to the user by exception class and service')
+credits_spent = Counter('ri_credits_spent_total', 'Credits reported as spent by the remote service')
+
+def render():
+    return '\n'.join(line for metric in registry for line in metric.render()) + '\n'
+
+def metrics_endpoint():
+    return PlainTextResponse(render(), media_type='text/plain; version=0.0.4')
@@ -0,0 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import threading
+import time
+
+import modules.shared
+
+from extension import remote_profiler, remote_metrics
+
+MIN_POLL_DELAY = 0.5
+MAX_POLL_DELAY = 10
+POLL_WORKERS = 4
+
+def clamp_delay(delay):
+    return min(max(delay, MIN_POLL_DELAY), MAX_POLL_DELAY)
+
+def delay_from_wait_time(wait_time):
+    return clamp_delay(wait_time/2) if wait_time else MIN_POLL_DELAY*2
+
+def delay_from_progress(elapsed, progress_percent):
+    if not progress_percent:
+        return MIN_POLL_DELAY*4
+    remaining = elapsed * (100 - progress_percent) / progress_percent
+    return clamp_delay(remaining/2)
+
+class PollJob:
+    def __init__(self, service, job_id, poll, max_delay=MAX_POLL_DELAY):
+        self.service = service
+        self.job_id = job_id
+        self.poll = poll
+        self.max_delay = max_delay
+        self.start = time.time()
+        self.polls = 0
+        self.due = None
+        self.polling = False
+        self.woken = False
+        self.running = False
+        self.profile = remote_profiler.current()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start
+
+    def mark_running(self):
+        if not self.running:
+            self.running = True
+            remote_metrics.queue_wait.observe(self.elapsed, service=self.service.name)
+            if self.profile:
+                self.profile.add('queue', self.start, time.time())
+
+    def finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.done.set()
+
+    def wait(self, timeout=None):
+        if not self.done.wait(timeout):
+            raise TimeoutError(f'RI: {self.service} job {self.job_id} did not finish in time')
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+class PollScheduler:
+    def __init__(self):
+        self.jobs = {}
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.executor = ThreadPoolExecutor(max_workers=POLL_WORKERS, thread_name_prefix='RI poll')
+
+    # poll(job) returns (done, result, next_delay) and raises to fail the job
+    def submit(self, service, job_id, poll, delay=0, max_delay=MAX_POLL_DELAY):
+        job = PollJob(service, job_id, poll, max_delay)
+        with self.condition:
+            self.jobs[(service, job_id)] = job
+            self.schedule(job, delay)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='RI poll scheduler', daemon=True)
+                self.thread.start()
+        return job
+
+    def schedule(self, job, delay):
+        job.due = time.time() + delay
+        heapq.heappush(self.queue, (job.due, next(self.counter), job))
+        self.condition.notify()
+
+    def wake(self, service, job_id):
+        with self.condition:
+            job = self.jobs.get((service, job_id))
+            if job is not None:
+                if job.polling:
+                    job.woken = True
+                else:
+                    self.schedule(job, 0)
+        return job is not None
+
+    def cancel(self, service, job_id, error=None):
+        with self.condition:
+            job = self.jobs.pop((service, job_id), None)
+        if job is not None:
+            job.finish(error=error or InterruptedError(f'RI: {service} job {job_id} cancelled'))
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue or self.queue[0][0] > time.time():
+                    self.condition.wait(self.queue[0][0] - time.time() if self.queue else None)
+                due, _, job = heapq.heappop(self.queue)
+                if due != job.due or job.polling or job.done.is_set() or self.jobs.get((job.service, job.job_id)) is not job:
+                    continue
+                job.due = None
+                job.polling = True
+            self.executor.submit(self.poll_job, job)
+
+    def poll_job(self, job):
+        job.polls += 1
+        try:
+            with remote_profiler.activate(job.profile, phase='poll'):
+                done, result, next_delay = job.poll(job)
+        except Exception as e:
+            with self.condition:
+                job.polling = False
+                self.jobs.pop((job.service, job.job_id), None)
+            job.finish(error=e)
+            return
+
+        with self.condition:
+            job.polling = False
+            if not done:
+                if job.woken:
+                    job.woken = False
+                    self.schedule(job, 0)
+                elif job.due is None:
+                    self.schedule(job, min(max(next_delay, MIN_POLL_DELAY), job.max_delay))
+                return
+            self.jobs.pop((job.service, job.job_id), None)
+
+        modules.shared.log.debug(f'RI: {job.service} job {job.job_id} done after {job.polls} polls in {job.elapsed:.1f}s')
+        remote_metrics.job_polls.observe(job.polls, service=job.service.name)
+        remote_metrics.job_duration.observe(job.elapsed, service=job.service.name)
+        if job.profile:
+            job.profile.add('remote', job.start, time.time(), job=str(job.job_id), polls=job.polls)
+        job.finish(result=result)
+
+poll_scheduler = PollScheduler()
+
+def wait_for_job(service, job_id, poll, delay=0, max_delay=MAX_POLL_DELAY, on_cancel=None):
+    job = poll_scheduler.submit(service, job_id, poll, delay, max_delay)
+    while not job.done.wait(1):
+        if modules.shared.state.interrupted:
+            poll_scheduler.cancel(service, job_id)
+            if on_cancel:
+                try:
+                    on_cancel()
+                except Exception as e:
+                    modules.shared.log.warning(f'RI: Unable to cancel {service} job {job_id} remotely: {e}')
+    return job.wait()
@@ -1,57 +1,164 @@
-import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import threading
+from PIL import Image
 
 from modules import shared
+import modules.scripts
 from modules.scripts_postprocessing import PostprocessedImage
 
-from extension.utils_remote import RemoteInferencePostprocessError, get_current_api_service, RemoteService, encode_image, get_image, request_or_error, imported_scripts
+from extension.utils_remote import RemoteInferencePostprocessError, counting_errors, get_current_api_service, RemoteService, encode_image, get_image, image_hash, request_or_error, imported_scripts
+from extension.remote_poller import wait_for_job
+
+def get_forms(runner, args):
+    forms = []
+    for script in runner.scripts_in_preferred_order():
+        process_args = {}
+        for (name, _component), value in zip(script.controls.items(),  args[script.args_from:script.args_to]):
+            process_args[name] = value
+
+        if isinstance(script, imported_scripts['codeformer'].script_class):
+            if(process_args["codeformer_visibility"] == 0):
+                continue
+            forms.append('CodeFormers')
+        elif isinstance(script, imported_scripts['gfpgan'].script_class):
+            if(process_args["gfpgan_visibility"] == 0):
+                continue
+            forms.append('GFPGAN')
+        elif isinstance(script, imported_scripts['rembg'].script_class):
+            if(process_args["model"] == 'None'):
+                continue
+            forms.append('strip_background')
+        elif isinstance(script, imported_scripts['upscale'].script_class):
+            if(process_args["upscaler_1_name"] == 'None'):
+                continue
+            forms.append(process_args["upscaler_1_name"])
+        else:
+            shared.log.warning(f"RI: {get_current_api_service()} unable to do script of type {type(script).__name__}")
+    return tuple(forms)
+
+#================================== StableHorde ==================================
+def run_form(service, image, form):
+    payload = {
+        "forms": [{"name": form}],
+        "source_image": encode_image(image),
+        "slow_workers": shared.opts.remote_stablehorde_slow_workers
+    }
+
+    response = request_or_error(service, '/v2/interrogate/async', method='POST', data=payload)
+    uuid = response['id']
+
+    def poll(job):
+        status = request_or_error(service, f'/v2/interrogate/status/{uuid}')
+        if status['state'] == 'done':
+            return True, status, None
+        elif status['state'] == 'faulted':
+            raise RemoteInferencePostprocessError(service, f'{form} failed')
+        return False, None, 2
+
+    cancel = lambda: request_or_error(service, f'/v2/interrogate/status/{uuid}', method='DELETE')
+    status = wait_for_job(service, uuid, poll, on_cancel=cancel)
+    return get_image(status['forms'][0]['result'][form])
+
+def run_forms(service, image, forms):
+    for form in forms:
+        image = run_form(service, image, form)
+    return image
+
+#================================== Batches ==================================
+class PostprocessBatch:
+    def __init__(self, service, forms, sources):
+        self.service = service
+        self.forms = forms
+        self.results = {}
+        self.loading = len(sources)
+        self.closed = False
+        self.condition = threading.Condition()
+        self.executor = ThreadPoolExecutor(max_workers=shared.opts.data.get('remote_max_parallel_jobs', 4), thread_name_prefix='RI postprocess')
+        for source in sources:
+            self.executor.submit(self.run, source)
+
+    def run(self, source):
+        future = Future()
+        try:
+            if self.closed:
+                return
+            image = Image.open(source).convert('RGB')
+            key = image_hash(image)
+            with self.condition:
+                if self.closed:
+                    return
+                self.results.setdefault(key, future)
+        except Exception as e:
+            shared.log.debug(f'RI: Unable to prefetch postprocess source {source}: {e}')
+            return
+        finally:
+            with self.condition:
+                self.loading -= 1
+                self.condition.notify_all()
+
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(run_forms(self.service, image, self.forms))
+            except Exception as e:
+                future.set_exception(e)
+
+    def take(self, image, forms):
+        if forms != self.forms:
+            return None
+        key = image_hash(image)
+        with self.condition:
+            self.condition.wait_for(lambda: key in self.results or self.loading == 0)
+            return self.results.pop(key, None)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            for future in self.results.values():
+                future.cancel()
+            self.results.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+current_batch = None
+
+def batch_sources(extras_mode, image_folder, input_dir):
+    if extras_mode == 1:
+        return [getattr(file, 'name', file) for file in image_folder or []]
+    elif extras_mode == 2 and input_dir and os.path.isdir(input_dir):
+        return [os.path.join(input_dir, name) for name in sorted(os.listdir(input_dir)) if os.path.isfile(os.path.join(input_dir, name))]
+    return []
+
+def pipelined_postprocessing(run_postprocessing):
+    if getattr(run_postprocessing, 'remote_pipelined', False):
+        return run_postprocessing
+
+    def run(extras_mode, image, image_folder, input_dir, output_dir, show_extras_results, *args, **kwargs):
+        global current_batch
+        service = get_current_api_service()
+        sources = batch_sources(extras_mode, image_folder, input_dir) if service == RemoteService.StableHorde else []
+        forms = get_forms(modules.scripts.scripts_postproc, args) if len(sources) > 1 else ()
+
+        if forms:
+            current_batch = PostprocessBatch(service, forms, sources)
+        try:
+            return run_postprocessing(extras_mode, image, image_folder, input_dir, output_dir, show_extras_results, *args, **kwargs)
+        finally:
+            if current_batch:
+                current_batch.close()
+                current_batch = None
+    run.remote_pipelined = True
+    return run
 
 def remote_run(self, pp: PostprocessedImage, args):
     service = get_current_api_service()
 
     #================================== StableHorde ==================================
-    if service == RemoteService.StableHorde:      
-        for script in self.scripts_in_preferred_order():
-            process_args = {}
-            for (name, _component), value in zip(script.controls.items(),  args[script.args_from:script.args_to]):
-                process_args[name] = value
-
-            if isinstance(script, imported_scripts['codeformer'].script_class):
-                if(process_args["codeformer_visibility"] == 0):
-                    continue
-                form = 'CodeFormers'
-            elif isinstance(script, imported_scripts['gfpgan'].script_class):
-                if(process_args["gfpgan_visibility"] == 0):
-                    continue
-                form = 'GFPGAN'
-            elif isinstance(script, imported_scripts['rembg'].script_class):
-                if(process_args["model"] == 'None'):
-                    continue
-                form = 'strip_background'
-            elif isinstance(script, imported_scripts['upscale'].script_class):
-                if(process_args["upscaler_1_name"] == 'None'):
-                    continue
-                form = process_args["upscaler_1_name"]
-            else:
-                script_type = type(script).split('\'')[1]
-                shared.log.warning(f"RI: {service} unable to do script of type {script_type}")
-                continue
-        
-            payload = {
-                "forms": [{"name": form}],
-                "source_image": encode_image(pp.image),
-                "slow_workers": shared.opts.remote_stablehorde_slow_workers
-            }
-
-            shared.state.job = service.name
-
-            response = request_or_error(service, '/v2/interrogate/async', method='POST', data=payload)
-            uuid = response['id']
-
-            while True:
-                status = request_or_error(service, f'/v2/interrogate/status/{uuid}')
-                state = status['state']
-                
-                if state == 'done':
-                    pp.image = get_image(status['forms'][0]['result'][form])
-                    break
-                time.sleep(7.5)
\ No newline at end of file
+    if service == RemoteService.StableHorde:
+        forms = get_forms(self, args)
+        if not forms:
+            return
+
+        shared.state.job = service.name
+        with counting_errors(service):
+            future = current_batch.take(pp.image, forms) if current_batch else None
+            pp.image = future.result() if future else run_forms(service, pp.image, forms)
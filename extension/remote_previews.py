@@ -0,0 +1,105 @@
+import hashlib
+import io
+import os
+import threading
+import requests
+from PIL import Image
+from fastapi import HTTPException
+from fastapi.responses import FileResponse, RedirectResponse
+
+import modules.shared
+
+from extension.utils_remote import get_session
+
+PREVIEW_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'previews')
+PREVIEW_PATH = '/sdapi/v1/remote-preview'
+THUMBNAIL_SIZE = (384, 384)
+THUMBNAIL_QUALITY = 80
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+known_previews = {}
+preview_locks = {}
+preview_lock = threading.Lock()
+cache_size = None
+
+def proxy_preview(url):
+    if not url or not url.startswith('http') or not modules.shared.opts.data.get('remote_preview_proxy', True):
+        return url
+    key = hashlib.sha1(url.encode()).hexdigest()
+    known_previews[key] = url
+    return f'{PREVIEW_PATH}/{key}'
+
+def preview_path(key):
+    return os.path.join(PREVIEW_DIR, f'{key}.webp')
+
+def make_thumbnail(content):
+    image = Image.open(io.BytesIO(content))
+    image.draft('RGB', THUMBNAIL_SIZE)
+    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, format='WEBP', quality=THUMBNAIL_QUALITY, method=4)
+    return buffer.getvalue()
+
+def get_cache_size():
+    global cache_size
+    if cache_size is None:
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        cache_size = sum(entry.stat().st_size for entry in os.scandir(PREVIEW_DIR) if entry.is_file())
+    return cache_size
+
+def evict_previews():
+    global cache_size
+    max_size = modules.shared.opts.data.get('remote_preview_cache_size', 200) * 1024**2
+    if get_cache_size() <= max_size:
+        return
+    entries = sorted((entry for entry in os.scandir(PREVIEW_DIR) if entry.is_file()), key=lambda entry: entry.stat().st_mtime)
+    for entry in entries:
+        if cache_size <= max_size * 0.9:
+            break
+        try:
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            cache_size -= size
+        except OSError:
+            pass
+
+def store_preview(key, url):
+    response = get_session().get(url, timeout=30)
+    response.raise_for_status()
+    thumbnail = make_thumbnail(response.content)
+
+    global cache_size
+    with preview_lock:
+        path = preview_path(key)
+        get_cache_size()
+        with open(path + '.tmp', 'wb') as f:
+            f.write(thumbnail)
+        os.replace(path + '.tmp', path)
+        cache_size += len(thumbnail)
+        evict_previews()
+
+def preview_endpoint(key: str):
+    url = known_previews.get(key)
+    if url is None:
+        raise HTTPException(status_code=404, detail='Unknown preview')
+
+    path = preview_path(key)
+    with preview_lock:
+        key_lock = preview_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if not os.path.isfile(path):
+            try:
+                store_preview(key, url)
+            except (requests.RequestException, OSError, ValueError) as e:
+                modules.shared.log.debug(f'RI: Unable to cache preview {url}: {e}')
+                return RedirectResponse(url)
+            finally:
+                with preview_lock:
+                    preview_locks.pop(key, None)
+        else:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+    return FileResponse(path, media_type='image/webp', headers={'Cache-Control': CACHE_CONTROL})
@@ -1,8 +1,15 @@
 import json
-import time
 import math
+import copy
+import itertools
 from PIL import Image
 import re
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
+
+from fastapi import Request
 
 import modules.processing
 from modules.processing import StableDiffusionProcessing, StableDiffusionProcessingTxt2Img, StableDiffusionProcessingImg2Img, Processed
@@ -10,8 +17,22 @@ import modules.shared
 from modules.shared import state, log, opts
 import modules.images
 
-from extension.utils_remote import encode_image, decode_image, download_images, get_current_api_service, get_image, request_or_error, RemoteService, RemoteInferenceProcessError, imported_scripts, ModelType
+from extension.utils_remote import counting_errors, encode_image, encode_images, decode_image, decode_images, download_images, prefetch_image, get_current_api_service, request_or_error, GENERATION_TIMEOUT, RemoteService, RemoteInferenceProcessError, RemoteInferenceAPIError, imported_scripts, ModelType, get_endpoint_pool, get_remote_endpoints
 from extension.remote_extra_networks import get_models
+from extension.remote_poller import wait_for_job, delay_from_wait_time, delay_from_progress, poll_scheduler, MAX_POLL_DELAY
+from extension.remote_comfyui import load_workflow, run_prompt
+from extension.remote_writer import writer
+from extension import remote_profiler, remote_metrics
+
+STABLEHORDE_WEBHOOK_PATH = '/sdapi/v1/remote-webhook/stablehorde'
+WEBHOOK_FALLBACK_DELAY = 30
+STABLEHORDE_PREVIEW_INTERVAL = 30
+PROGRESS_INTERVAL = 1
+
+MAX_BATCH_SIZE = {
+    RemoteService.StableHorde: 20,
+    RemoteService.NovitaAI: 8
+}
 
 class RemoteModel:
     def __init__(self, checkpoint_info):
@@ -26,11 +47,46 @@ def fake_reload_model_weights(sd_model=None, info=None, reuse_dict=False, op='mo
 
         opts.sd_model_checkpoint = checkpoint_info.title
         modules.shared.sd_model = model
+        preload_remote_checkpoint(checkpoint_info.title)
         return model
     except (StopIteration, AttributeError):
         log.warning("RI: Unable to load model, try refreshing model list")
         return None
 
+resident_checkpoints = {}
+checkpoint_locks = {}
+checkpoint_locks_lock = threading.Lock()
+
+def ensure_remote_checkpoint(service: RemoteService, endpoint, checkpoint):
+    with checkpoint_locks_lock:
+        lock = checkpoint_locks.setdefault(endpoint, threading.Lock())
+
+    with lock:
+        if endpoint not in resident_checkpoints:
+            resident_checkpoints[endpoint] = request_or_error(service, '/sdapi/v1/options', endpoint=endpoint).get('sd_model_checkpoint')
+        if resident_checkpoints[endpoint] == checkpoint:
+            return
+
+        log.info(f'RI: Loading {checkpoint} on {endpoint}')
+        resident_checkpoints.pop(endpoint)
+        request_or_error(service, '/sdapi/v1/options', method='POST', data={'sd_model_checkpoint': checkpoint}, endpoint=endpoint, timeout=GENERATION_TIMEOUT)
+        request_or_error(service, '/sdapi/v1/reload-checkpoint', method='POST', endpoint=endpoint, timeout=GENERATION_TIMEOUT)
+        resident_checkpoints[endpoint] = checkpoint
+
+def preload_remote_checkpoint(checkpoint):
+    service = get_current_api_service()
+    if service != RemoteService.SDNext:
+        return
+
+    def preload(endpoint):
+        try:
+            ensure_remote_checkpoint(service, endpoint, checkpoint)
+        except RemoteInferenceAPIError as e:
+            log.warning(f'RI: Unable to preload {checkpoint} on {endpoint}: {e}')
+
+    for endpoint in get_remote_endpoints(service):
+        threading.Thread(target=preload, args=(endpoint,), daemon=True).start()
+
 def build_payload(service: RemoteService, p: StableDiffusionProcessing):
     txt2img = isinstance(p, StableDiffusionProcessingTxt2Img)
     img2img = isinstance(p, StableDiffusionProcessingImg2Img)
@@ -74,7 +130,7 @@ def build_payload(service: RemoteService, p: StableDiffusionProcessing):
         data = vars(p)
         payload = {key: data[key] for key in (txt2img_keys if txt2img else img2img_keys) if key in data.keys() and data[key] is not None}
         if img2img:
-            payload['init_images'] = [encode_image(img) for img in payload['init_images']]
+            payload['init_images'] = encode_images(payload['init_images'])
         
         return payload
     
@@ -83,11 +139,17 @@ def build_payload(service: RemoteService, p: StableDiffusionProcessing):
     elif service in [RemoteService.ComfyUI, RemoteService.ComfyICU]:
         p.prompt, p.negative_prompt, loras, tis = get_loras_tis(p.prompt, p.negative_prompt, True, False)
 
-        with open('extensions/sdnext-remote/workflows/txt2img.json') as f:
-            prompt = json.loads("\n".join(f.readlines()))
-
-        prompt["4"]["inputs"]["ckpt_name"] = model
-        prompt["6"]["inputs"]["text"] = p.prompt
+        prompt = load_workflow('txt2img').instantiate(
+            ckpt_name=model,
+            positive=p.prompt,
+            negative=p.negative_prompt,
+            seed=p.seed,
+            steps=p.steps,
+            cfg=p.cfg_scale,
+            width=p.width,
+            height=p.height,
+            batch_size=p.n_iter*p.batch_size
+        )
         payload = {"prompt": prompt}
 
         return payload
@@ -150,8 +212,9 @@ def build_payload(service: RemoteService, p: StableDiffusionProcessing):
             # dry_run
             # proxied_account
             # disable_batching
-            # webhook
         }
+        if opts.remote_stablehorde_webhook_url:
+            payload["webhook"] = opts.remote_stablehorde_webhook_url.rstrip('/') + STABLEHORDE_WEBHOOK_PATH
 
         if txt2img:
             if control_units: 
@@ -165,10 +228,10 @@ def build_payload(service: RemoteService, p: StableDiffusionProcessing):
                     payload["params"]["denoising_strength"] = unit.weight
                 payload["source_image"] = encode_image(Image.fromarray(unit.image['image']))
         elif img2img:
-            payload["source_image"] = encode_image(p.init_images[0])
+            payload["source_image"], *source_mask = encode_images([p.init_images[0]] + ([p.image_mask] if inpainting else []))
             if inpainting:
                 payload["source_processing"] = "inpainting"
-                payload["source_mask"] = encode_image(p.image_mask)
+                payload["source_mask"] = source_mask[0]
 
         return payload
 
@@ -221,23 +284,24 @@ def build_payload(service: RemoteService, p: StableDiffusionProcessing):
                     }
                 })
         elif img2img:
+            init_image, mask_image, *control_images = encode_images([p.init_images[0], p.image_mask if inpainting else None] + [unit.image for unit in control_units], format="PNG")
             payload["request"].update({
-                "image_base64": encode_image(p.init_images[0], format="PNG"),
+                "image_base64": init_image,
                 "strength": p.denoising_strength,
                 "controlnet": {
                     "units": [{
                         "model_name": unit.model,
-                        "image_base64": encode_image(unit.image, format="PNG"),
+                        "image_base64": control_image,
                         "strength": unit.weight,
                         "preprocessor": unit.module,
                         "guidance_start": unit.guidance_start,
                         "guidance_end": unit.guidance_end
-                    } for unit in control_units]
+                    } for unit, control_image in zip(control_units, control_images)]
                 }
             })
             if inpainting:
                 payload["request"].update({
-                    "mask_image_base64": encode_image(p.image_mask, format="PNG"),
+                    "mask_image_base64": mask_image,
                     "mask_blur": p.mask_blur,
                     "inpainting_full_res": int(p.inpaint_full_res),
                     "inpainting_full_res_padding": p.inpaint_full_res_padding,
@@ -248,13 +312,123 @@ def build_payload(service: RemoteService, p: StableDiffusionProcessing):
 
         return payload
 
+def show_preview(image):
+    state.current_image = image
+    state.id_live_preview += 1
+
+def image_received(index, image):
+    state.textinfo = f"Received image {index+1}"
+    show_preview(image)
+
+def receive_images(service: RemoteService, imgs, prefetched=None):
+    state.textinfo = "Downloading images..."
+    results = download_images(imgs, on_image=image_received, prefetched=prefetched)
+    for result in results:
+        if not result.ok:
+            log.warning(f'RI: Unable to download {result.url} after {result.attempts} attempts: {result.error}')
+
+    images = [result.image for result in results if result.ok]
+    if len(images) == 0:
+        raise RemoteInferenceProcessError(service, 'Generation failed, no output image')
+    return images
+
+async def stablehorde_webhook(request: Request):
+    try:
+        payload = await request.json()
+    except ValueError:
+        return {'woken': False}
+    job_id = payload.get('request') or payload.get('id')
+    log.debug(f'RI: StableHorde webhook for {job_id}')
+    return {'woken': bool(job_id) and poll_scheduler.wake(RemoteService.StableHorde, job_id)}
+
+@contextmanager
+def watch_sdnext_progress(service: RemoteService, endpoint):
+    stop = threading.Event()
+
+    def watch():
+        current_image = None
+        skip_current_image = 'false' if opts.data.get('live_previews_enable', True) else 'true'
+        while not stop.wait(PROGRESS_INTERVAL):
+            try:
+                progress = request_or_error(service, f'/sdapi/v1/progress?skip_current_image={skip_current_image}', endpoint=endpoint)
+            except RemoteInferenceAPIError as e:
+                log.debug(f'RI: Unable to get progress from {endpoint}: {e}')
+                continue
+            remote_state = progress.get('state') or {}
+            if remote_state.get('sampling_steps'):
+                state.sampling_steps = remote_state['sampling_steps']
+                state.sampling_step = remote_state.get('sampling_step', 0)
+            if progress.get('textinfo'):
+                state.textinfo = progress['textinfo']
+            if progress.get('current_image') and progress['current_image'] != current_image:
+                current_image = progress['current_image']
+                try:
+                    show_preview(decode_image(current_image))
+                except (ValueError, OSError):
+                    pass
+
+    thread = threading.Thread(target=watch, name=f'RI progress {endpoint}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+
+def split_batches(service: RemoteService, p: StableDiffusionProcessing):
+    if service == RemoteService.SDNext:
+        return p.n_iter*[p.batch_size]
+
+    n = p.n_iter*p.batch_size
+    max_batch_size = MAX_BATCH_SIZE.get(service)
+    if not max_batch_size:
+        return [n]
+    return [min(max_batch_size, n-i) for i in range(0, n, max_batch_size)]
+
+def seed_step(service: RemoteService):
+    return 1 if service == RemoteService.SDNext else 1000
+
 def generate_images(service: RemoteService, p: StableDiffusionProcessing) -> Processed:
     p.seed = int(modules.processing.get_fixed_seed(p.seed))
     p.subseed = int(modules.processing.get_fixed_seed(p.subseed))
     p.prompt = modules.shared.prompt_styles.apply_styles_to_prompt(p.prompt, p.styles)
     p.negative_prompt = modules.shared.prompt_styles.apply_negative_styles_to_prompt(p.negative_prompt, p.styles)
 
-    payload = build_payload(service, p)
+    batches = split_batches(service, p)
+    if len(batches) == 1:
+        return generate_batch(service, p)
+
+    sub_jobs = []
+    for offset, size in zip(itertools.accumulate([0]+batches[:-1]), batches):
+        sub_p = copy.copy(p)
+        sub_p.n_iter, sub_p.batch_size = 1, size
+        sub_p.seed = p.seed + offset*seed_step(service)
+        sub_jobs.append(sub_p)
+
+    state.textinfo = f"Remote inference from {service}: {len(sub_jobs)} parallel jobs"
+    def generate_sub_job(sub_p):
+        try:
+            return generate_batch(service, sub_p), None
+        except Exception as e:
+            log.error(f'RI: {service} sub-job with seed {sub_p.seed} failed: {e}')
+            return None, e
+
+    with ThreadPool(min(len(sub_jobs), opts.remote_max_parallel_jobs)) as pool:
+        outcomes = pool.map(remote_profiler.propagate(generate_sub_job), sub_jobs)
+
+    results = [proc for proc, _ in outcomes if proc is not None]
+    errors = [error for _, error in outcomes if error is not None]
+    if not results:
+        raise errors[0]
+
+    p.prompt, p.negative_prompt = sub_jobs[0].prompt, sub_jobs[0].negative_prompt
+    proc = merge_processed(p, results)
+    if errors:
+        proc.comments = '\n'.join(filter(None, [proc.comments, f'RI: {len(errors)} of {len(sub_jobs)} remote jobs failed: {errors[0]}']))
+    return proc
+
+def generate_batch(service: RemoteService, p: StableDiffusionProcessing) -> Processed:
+    with remote_profiler.span('payload'):
+        payload = build_payload(service, p)
     txt2img = isinstance(p, StableDiffusionProcessingTxt2Img)
     img2img = isinstance(p, StableDiffusionProcessingImg2Img)
     inpainting = (p.image_mask is not None if img2img else False)
@@ -263,19 +437,39 @@ def generate_images(service: RemoteService, p: StableDiffusionProcessing) -> Pro
     if service == RemoteService.SDNext:
         processed_keys = ["seed", "info", "subseed", "all_prompts", "all_negative_prompts", "all_seeds", "all_subseeds", "index_of_first_image", "infotexts", "comments"]
 
-        request_or_error(service, '/sdapi/v1/options', method='POST', data={'sd_model_checkpoint': opts.sd_model_checkpoint})
-        request_or_error(service, '/sdapi/v1/reload-checkpoint', method='POST')
-        response = request_or_error(service, ('/sdapi/v1/txt2img' if txt2img else '/sdapi/v1/img2img'), method='POST', data=payload)
-
-        info = json.loads(response['info'])
+        checkpoint = opts.sd_model_checkpoint
+        payload['override_settings'] = {**(payload.get('override_settings') or {}), 'sd_model_checkpoint': checkpoint}
+        payload['override_settings_restore_afterwards'] = False
+
+        with get_endpoint_pool(service).acquire() as endpoint:
+            ensure_remote_checkpoint(service, endpoint, checkpoint)
+            try:
+                with watch_sdnext_progress(service, endpoint):
+                    response = request_or_error(service, ('/sdapi/v1/txt2img' if txt2img else '/sdapi/v1/img2img'), method='POST', data=payload, endpoint=endpoint, timeout=GENERATION_TIMEOUT)
+            except RemoteInferenceAPIError:
+                resident_checkpoints.pop(endpoint, None)
+                raise
+            resident_checkpoints[endpoint] = checkpoint
+
+        info = json.loads(response.pop('info'))
         info = {key: info[key] for key in processed_keys if key in info.keys()}
-        return Processed(p=p, images_list=[decode_image(img) for img in response['images']], **info)
+        return Processed(p=p, images_list=decode_images(response.pop('images')), **info)
 
 
     #================================== ComfyUI ==================================
     elif service == RemoteService.ComfyUI:
-        response = request_or_error(service, '/prompt', method='POST', data=payload)
-        print(vars(response))
+        state.sampling_steps = p.steps
+        state.sampling_step = 0
+
+        def on_progress(value, maximum):
+            state.sampling_steps = maximum
+            state.sampling_step = value
+
+        with get_endpoint_pool(service).acquire() as endpoint:
+            urls = run_prompt(endpoint, payload['prompt'], on_progress)
+        state.sampling_step = state.sampling_steps
+        images = receive_images(service, urls)
+        return processed_from_images(p, images)
     
 
     #================================== ComfyICU ==================================
@@ -286,59 +480,75 @@ def generate_images(service: RemoteService, p: StableDiffusionProcessing) -> Pro
         
         state.sampling_steps = 100
         state.sampling_step = 0
-        start = time.time()
 
-        while True:
+        def poll(job):
             response = request_or_error(service, f'/v1/workflows/{workflow_id}/runs/{uuid}')
 
-            elapsed = int(time.time() - start)
+            elapsed = int(job.elapsed)
             state.sampling_steps = elapsed + 120
             state.sampling_step = elapsed
-            
+
             if response['status'] == 'COMPLETED':
-                state.sampling_step = state.sampling_steps
-                state.textinfo = "Downloading images..."
-                images = download_images(img['url'] for img in response['output'])
-                if len(images) == 0:
-                    raise RemoteInferenceProcessError(service, 'Generation failed, no output image')
-                return processed_from_images(p, images)
-            
+                return True, response, None
             elif response['status'] == 'ERROR':
                 error_message = response['output']['error']['exception_message']
                 raise RemoteInferenceProcessError(service, f'Generation failed with error {error_message}')
-            
-            time.sleep(5)
+            return False, None, 5
+
+        response = wait_for_job(service, uuid, poll)
+        state.sampling_step = state.sampling_steps
+        images = receive_images(service, (img['url'] for img in response['output']))
+        return processed_from_images(p, images)
 
 
     #================================== StableHorde ==================================
     elif service ==  RemoteService.StableHorde:
         response = request_or_error(service, '/v2/generate/async', method='POST', data=payload)
         uuid = response['id']
+        remote_metrics.credits_spent.inc(response.get('kudos', 0), service=service.name)
         
         state.sampling_steps = 100
         state.sampling_step = 0
-        start = time.time()
+        prefetched = {}
+        previews = {'finished': 0, 'time': 0}
 
-        while True:
+        def fetch_partial_generations():
+            response = request_or_error(service, f'/v2/generate/status/{uuid}')
+            for generation in response['generations']:
+                if generation['img'] not in prefetched:
+                    prefetched[generation['img']] = prefetch_image(generation['img'], on_image=show_preview)
+
+        def poll(job):
             status = request_or_error(service, f'/v2/generate/check/{uuid}')
 
-            elapsed = int(time.time() - start)
+            elapsed = int(job.elapsed)
             state.sampling_steps = elapsed + status["wait_time"]
             state.sampling_step = elapsed
-            
-            if status['done']:
-                state.sampling_step = state.sampling_steps
-                state.textinfo = "Downloading images..."
-                response = request_or_error(service, f'/v2/generate/status/{uuid}')
-                images = [get_image(generation['img']) for generation in response['generations']]
-                return processed_from_images(p, images)
+            if status['processing'] or status['finished']:
+                job.mark_running()
+
+            if not status['done'] and status['finished'] > previews['finished'] and status['wait_time'] > STABLEHORDE_PREVIEW_INTERVAL and time.time() - previews['time'] > STABLEHORDE_PREVIEW_INTERVAL:
+                previews.update(finished=status['finished'], time=time.time())
+                state.textinfo = f"Received {status['finished']} images, waiting for {status['waiting'] + status['processing']} more..."
+                try:
+                    fetch_partial_generations()
+                except RemoteInferenceAPIError as e:
+                    log.debug(f'RI: Unable to fetch partial StableHorde generations: {e}')
 
+            if status['done']:
+                return True, status, None
             elif status['faulted']:
                 raise RemoteInferenceProcessError(service, 'Generation failed')
             elif not status['is_possible']:
                 raise RemoteInferenceProcessError(service, 'Generation not possible with current worker pool')
-            
-            time.sleep(5)
+            return False, None, WEBHOOK_FALLBACK_DELAY if 'webhook' in payload else delay_from_wait_time(status['wait_time'])
+
+        cancel = lambda: request_or_error(service, f'/v2/generate/status/{uuid}', method='DELETE')
+        wait_for_job(service, uuid, poll, max_delay=WEBHOOK_FALLBACK_DELAY if 'webhook' in payload else MAX_POLL_DELAY, on_cancel=cancel)
+        state.sampling_step = state.sampling_steps
+        response = request_or_error(service, f'/v2/generate/status/{uuid}')
+        images = receive_images(service, (generation['img'] for generation in response['generations']), prefetched)
+        return processed_from_images(p, images)
 
 
     #================================== NovitaAI ==================================
@@ -346,24 +556,25 @@ def generate_images(service: RemoteService, p: StableDiffusionProcessing) -> Pro
         response = request_or_error(service, ('/v3/async/txt2img' if txt2img else ('/v3/async/inpainting' if inpainting else '/v3/async/img2img')), method='POST', data=payload)
         uuid = response['task_id']
 
-        while True:
+        def poll(job):
             response = request_or_error(service, f'/v3/async/task-result?task_id={uuid}')
 
             if response['task']['status'] == 'TASK_STATUS_PROCESSING':
+                job.mark_running()
                 state.sampling_steps = 100
                 state.sampling_step = response['task']['progress_percent']
-
+                return False, None, delay_from_progress(job.elapsed, response['task']['progress_percent'])
             elif response['task']['status'] == 'TASK_STATUS_SUCCEED':
-                state.sampling_step = 100
-                state.textinfo = "Downloading images..."
-                images = download_images(img['image_url'] for img in response['images'])
-                return processed_from_images(p, images)
-
+                return True, response, None
             elif response['task']['status'] == 'TASK_STATUS_FAILED':
                 reason = response['task']['reason']
                 raise RemoteInferenceProcessError(service, f'Generation failed: {reason}')
-            
-            time.sleep(5)
+            return False, None, 2
+
+        response = wait_for_job(service, uuid, poll)
+        state.sampling_step = 100
+        images = receive_images(service, (img['image_url'] for img in response['images']))
+        return processed_from_images(p, images)
 
 def processed_from_images(p, images):
     n = len(images)
@@ -385,31 +596,66 @@ def processed_from_images(p, images):
         infotexts=infotexts
     )
 
+def merge_processed(p, results):
+    keys = ['images', 'all_seeds', 'all_subseeds', 'all_prompts', 'all_negative_prompts', 'infotexts']
+    merged = {key: [] for key in keys}
+    for proc in results:
+        for key in keys:
+            merged[key] += getattr(proc, key)
+
+    return Processed(
+        p=p,
+        images_list=merged['images'],
+        seed=p.seed,
+        subseed=p.subseed,
+        all_seeds=merged['all_seeds'],
+        all_subseeds=merged['all_subseeds'],
+        all_prompts=merged['all_prompts'],
+        all_negative_prompts=merged['all_negative_prompts'],
+        infotexts=merged['infotexts'],
+        info=results[0].info,
+        comments='\n'.join(filter(None, dict.fromkeys(proc.comments for proc in results)))
+    )
+
+def save_grid(images, p, seed, prompt, info):
+    grid = modules.images.image_grid(images, rows=math.ceil(math.sqrt(len(images))))
+    modules.images.save_image(grid, p.outpath_grids, "grid", seed, prompt, opts.grid_format, info=info, short_filename=not opts.grid_extended_filename, p=p, grid=True)
+
 def save_images_and_add_grid(proc: Processed, p:StableDiffusionProcessing):
     if opts.save and not p.do_not_save_samples:
-        for i,img in enumerate(proc.images):
-            modules.images.save_image(img, path=p.outpath_samples, basename="", seed=proc.all_seeds[i], prompt=proc.all_prompts[i], extension=opts.samples_format, info=proc.infotexts[i], p=p)
+        with remote_profiler.span('save', images=len(proc.images)):
+            for i,img in enumerate(proc.images):
+                writer.save_image(img, path=p.outpath_samples, basename="", seed=proc.all_seeds[i], prompt=proc.all_prompts[i], extension=opts.samples_format, info=proc.infotexts[i], p=p)
 
     if (opts.return_grid or opts.grid_save) and not p.do_not_save_grid and len(proc.images) >= 2:
-        grid = modules.images.image_grid(proc.images, rows=math.ceil(math.sqrt(len(proc.images))))
         info = '\n'.join(proc.infotexts)
 
         if opts.return_grid:
+            with remote_profiler.span('grid'):
+                grid = modules.images.image_grid(proc.images, rows=math.ceil(math.sqrt(len(proc.images))))
+            if opts.grid_save:
+                writer.save_image(grid, p.outpath_grids, "grid", proc.all_seeds[0], proc.all_prompts[0], opts.grid_format, info=info, short_filename=not opts.grid_extended_filename, p=p, grid=True)
             proc.infotexts.insert(0, info)
             proc.images.insert(0, grid)
             proc.index_of_first_image = 1
-
-        if opts.grid_save:
-            modules.images.save_image(grid, p.outpath_grids, "grid", proc.all_seeds[0], proc.all_prompts[0], opts.grid_format, info=info, short_filename=not opts.grid_extended_filename, p=p, grid=True)
+        elif opts.grid_save:
+            writer.submit(save_grid, list(proc.images), p, proc.all_seeds[0], proc.all_prompts[0], info)
 
     return proc
 
 def process_images(p: StableDiffusionProcessing) -> Processed:
     remote_service = get_current_api_service()
 
+    profile = remote_profiler.JobProfile(remote_service, type(p).__name__) if remote_profiler.enabled() else None
+
     state.begin()
     state.textinfo = f"Remote inference from {remote_service}"
-    proc = generate_images(remote_service, p)
-    proc = save_images_and_add_grid(proc, p)
+    with counting_errors(remote_service), remote_profiler.activate(profile):
+        proc = generate_images(remote_service, p)
+        proc = save_images_and_add_grid(proc, p)
     state.end()
+
+    if profile:
+        profile.finish()
+        proc.comments = '\n'.join(filter(None, [proc.comments, profile.summary()]))
     return proc
\ No newline at end of file
@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import json
+import os
+import threading
+import time
+import uuid
+
+import modules.shared
+
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'profiles.jsonl')
+
+local = threading.local()
+write_lock = threading.Lock()
+
+def format_bytes(size):
+    for unit in ['B', 'KB', 'MB']:
+        if size < 1024:
+            return f'{size:.0f}{unit}' if unit == 'B' else f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+class JobProfile:
+    def __init__(self, service, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.service = service
+        self.kind = kind
+        self.start = time.time()
+        self.end = None
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def add(self, phase, start, end, **attrs):
+        with self.lock:
+            self.spans.append({'phase': phase, 'start': round(start - self.start, 4), 'duration': round(end - start, 4), **attrs})
+
+    @contextmanager
+    def span(self, phase, **attrs):
+        start = time.time()
+        try:
+            yield attrs
+        finally:
+            self.add(phase, start, time.time(), **attrs)
+
+    def totals(self):
+        totals = {}
+        with self.lock:
+            for span in self.spans:
+                total = totals.setdefault(span['phase'], {'count': 0, 'duration': 0, 'bytes': 0})
+                total['count'] += 1
+                total['duration'] += span['duration']
+                total['bytes'] += span.get('bytes', 0)
+        return totals
+
+    def summary(self):
+        parts = []
+        for phase, total in self.totals().items():
+            part = f"{phase} {total['duration']:.2f}s"
+            if total['count'] > 1:
+                part += f" x{total['count']}"
+            if total['bytes']:
+                part += f" {format_bytes(total['bytes'])}"
+            parts.append(part)
+        return f"Remote profile ({self.service.name}, {(self.end or time.time()) - self.start:.2f}s): " + ', '.join(parts)
+
+    def finish(self):
+        self.end = time.time()
+        record = {
+            'id': self.id,
+            'service': self.service.name,
+            'kind': self.kind,
+            'start': self.start,
+            'duration': round(self.end - self.start, 4),
+            'totals': self.totals(),
+            'spans': self.spans
+        }
+        try:
+            with write_lock:
+                os.makedirs(os.path.dirname(PROFILES_PATH), exist_ok=True)
+                with open(PROFILES_PATH, 'a') as f:
+                    f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            modules.shared.log.warning(f'RI: Unable to write profile: {e}')
+        modules.shared.log.info(f'RI: {self.summary()}')
+
+def enabled():
+    return modules.shared.opts.data.get('remote_profiler', False)
+
+def current():
+    return getattr(local, 'profile', None)
+
+def request_phase(default):
+    return getattr(local, 'request_phase', None) or default
+
+@contextmanager
+def activate(profile, phase=None):
+    previous = current(), getattr(local, 'request_phase', None)
+    local.profile, local.request_phase = profile, phase
+    try:
+        yield profile
+    finally:
+        local.profile, local.request_phase = previous
+
+def propagate(func):
+    profile = current()
+    def wrap(*args, **kwargs):
+        with activate(profile):
+            return func(*args, **kwargs)
+    return wrap
+
+@contextmanager
+def span(phase, **attrs):
+    profile = current()
+    if profile is None:
+        yield attrs
+    else:
+        with profile.span(phase, **attrs) as attrs:
+            yield attrs
+
+def endpoint_of(url):
+    return urlparse(url).netloc
@@ -0,0 +1,145 @@
+from collections import deque
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+import requests.adapters
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+import modules.shared
+
+DEFAULT_TRACE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'trace.jsonl.gz')
+
+class TraceRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.start = time.time()
+        self.lock = threading.Lock()
+        self.bodies = set()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = gzip.open(path, 'at')
+
+    def record(self, request, response, body, start, elapsed):
+        body_hash = hashlib.sha1(body).hexdigest()
+        entry = {
+            'method': request.method,
+            'url': request.url,
+            'offset': round(start - self.start, 4),
+            'elapsed': round(elapsed, 4),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'body_hash': body_hash
+        }
+        with self.lock:
+            if body_hash not in self.bodies:
+                self.bodies.add(body_hash)
+                entry['body'] = base64.b64encode(body).decode()
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+class RecordingAdapter(requests.adapters.HTTPAdapter):
+    def __init__(self, recorder, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+
+    def send(self, request, **kwargs):
+        start = time.time()
+        response = super().send(request, **kwargs)
+        body = response.content or b''
+        self.recorder.record(request, response, body, start, time.time() - start)
+        return response
+
+class TraceReplay:
+    def __init__(self, path):
+        self.entries = {}
+        self.lock = threading.Lock()
+        bodies = {}
+        with gzip.open(path, 'rt') as f:
+            for line in f:
+                entry = json.loads(line)
+                if 'body' in entry:
+                    bodies[entry['body_hash']] = base64.b64decode(entry.pop('body'))
+                entry['body'] = bodies[entry['body_hash']]
+                self.entries.setdefault((entry['method'], entry['url']), deque()).append(entry)
+
+    def next_entry(self, method, url):
+        with self.lock:
+            entries = self.entries.get((method, url))
+            if not entries:
+                return None
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+class ReplayAdapter(requests.adapters.BaseAdapter):
+    def __init__(self, replay, speed=1.0):
+        super().__init__()
+        self.replay = replay
+        self.speed = speed
+
+    def send(self, request, **kwargs):
+        entry = self.replay.next_entry(request.method, request.url)
+        if entry is None:
+            raise requests.ConnectionError(f'RI: no recorded response for {request.method} {request.url}', request=request)
+        if self.speed > 0:
+            time.sleep(entry['elapsed'] / self.speed)
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers.pop('Content-Encoding', None)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry['body']
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        pass
+
+recorder = None
+replay = None
+transport_lock = threading.Lock()
+def install(session, pool_size):
+    global recorder, replay
+    mode = modules.shared.opts.data.get('remote_transport_mode', 'Off')
+    path = modules.shared.opts.data.get('remote_transport_trace') or DEFAULT_TRACE_PATH
+
+    with transport_lock:
+        if mode == 'Record':
+            if recorder is None or recorder.path != path:
+                recorder = TraceRecorder(path)
+                modules.shared.log.info(f'RI: Recording remote traffic to {path}')
+            adapter = RecordingAdapter(recorder, pool_connections=pool_size, pool_maxsize=pool_size)
+        elif mode == 'Replay':
+            if replay is None:
+                try:
+                    replay = TraceReplay(path)
+                except (OSError, ValueError) as e:
+                    modules.shared.log.error(f'RI: Unable to load trace {path}: {e}')
+                    return
+                modules.shared.log.info(f'RI: Replaying remote traffic from {path}')
+            adapter = ReplayAdapter(replay, modules.shared.opts.data.get('remote_transport_replay_speed', 1.0))
+        else:
+            return
+
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+def reset():
+    global recorder, replay
+    with transport_lock:
+        if recorder is not None:
+            recorder.close()
+        recorder = replay = None
@@ -0,0 +1,55 @@
+import atexit
+import queue
+import threading
+
+import modules.shared
+import modules.images
+
+DEFAULT_QUEUE_SIZE = 64
+SHUTDOWN_TIMEOUT = 30
+
+class ImageWriter:
+    def __init__(self, max_size=DEFAULT_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=max_size)
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self.run, name='RI image writer', daemon=True)
+                self.worker.start()
+
+    def run(self):
+        while True:
+            func, args, kwargs = self.queue.get()
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                modules.shared.log.error(f'RI: Failed to save image: {type(e).__name__}: {e}')
+            finally:
+                self.queue.task_done()
+
+    def submit(self, func, *args, **kwargs):
+        self.start()
+        if self.queue.full():
+            modules.shared.log.debug(f'RI: Image writer queue full ({self.queue.maxsize}), waiting')
+        self.queue.put((func, args, kwargs))
+
+    def save_image(self, image, *args, **kwargs):
+        self.submit(modules.images.save_image, image, *args, **kwargs)
+
+    def pending(self):
+        return self.queue.unfinished_tasks
+
+    def flush(self, timeout=SHUTDOWN_TIMEOUT):
+        if self.worker is None or not self.pending():
+            return
+        done = threading.Thread(target=self.queue.join, daemon=True)
+        done.start()
+        done.join(timeout)
+        if done.is_alive():
+            modules.shared.log.warning(f'RI: {self.pending()} images were not saved before shutdown')
+
+writer = ImageWriter(modules.shared.opts.data.get('remote_save_queue_size', DEFAULT_QUEUE_SIZE))
+atexit.register(writer.flush)
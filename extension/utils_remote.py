@@ -1,17 +1,30 @@
 from enum import Enum
 import copy
 import requests
+import requests.adapters
 import json
+import logging
 import time
+import threading
 import base64
 import io
 from PIL import Image
-from multiprocessing.pool import ThreadPool
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+from urllib.parse import urlparse
+from datetime import datetime, timezone
+import email.utils
+import hashlib
+import random
 import itertools
+from contextlib import contextmanager
 
 import modules.shared
 import modules.scripts
 
+from extension.remote_endpoints import get_pool
+from extension import remote_profiler, remote_metrics, remote_transport
+
 ModelType = Enum('ModelType', ['CHECKPOINT','LORA','EMBEDDING','HYPERNET','VAE','SAMPLER','UPSCALER','CONTROLNET'])
 
 class RemoteService(Enum):
@@ -31,8 +44,16 @@ class RemoteService(Enum):
         self.credits_symbol = credits_symbol
         self.client_agent = client_agent
 
+def get_remote_endpoints(remote_service):
+    endpoints = modules.shared.opts.data.get(f'remote_{remote_service.name.lower()}_api_endpoint', remote_service.default_endpoint) or ''
+    return [endpoint.strip() for endpoint in endpoints.split(',') if endpoint.strip()] or [remote_service.default_endpoint]
+
+def get_endpoint_pool(remote_service):
+    return get_pool(remote_service, get_remote_endpoints(remote_service), get_session)
+
 def get_remote_endpoint(remote_service):
-    return modules.shared.opts.data.get(f'remote_{remote_service.name.lower()}_api_endpoint', remote_service.default_endpoint)
+    endpoints = get_remote_endpoints(remote_service)
+    return endpoints[0] if len(endpoints) == 1 else get_endpoint_pool(remote_service).pick().url
 
 def get_api_key(remote_service):
     return modules.shared.opts.data.get(f'remote_{remote_service.name.lower()}_api_key')
@@ -68,8 +89,10 @@ def import_script_data(dict):
     imported_scripts.update({name: get_script_data(path) for name,path in dict.items()})
 
 class RemoteInferenceAPIError(Exception):
-    def __init__(self, service, error):
+    def __init__(self, service, error, status_code=None):
         super().__init__(f'RI: error with {service} api call: {error}')
+        self.error = error
+        self.status_code = status_code
 
 class RemoteInferenceProcessError(Exception):
     def __init__(self, service, error):
@@ -79,6 +102,22 @@ class RemoteInferencePostprocessError(Exception):
     def __init__(self, service, error):
         super().__init__(f'RI: error with postprocess task for {service}: {error}')
 
+error_scope = threading.local()
+
+@contextmanager
+def counting_errors(service):
+    outermost = not getattr(error_scope, 'active', False)
+    error_scope.active = True
+    try:
+        yield
+    except Exception as e:
+        if outermost and not isinstance(e, InterruptedError):
+            remote_metrics.errors.inc(exception=type(e).__name__, service=getattr(service, 'name', service))
+        raise
+    finally:
+        if outermost:
+            error_scope.active = False
+
 def get_payload_str(payload):
     def truncate(value, max_length=50):
         if isinstance(value, str):
@@ -101,76 +140,339 @@ def clean_payload_dict(payload):
             return value
     return clean(payload)
 
-def request_or_error(service, path, no_headers=False, method='GET', data=None):
+sessions = {}
+sessions_lock = threading.Lock()
+def get_session(service=None):
+    with sessions_lock:
+        if service not in sessions:
+            pool_size = modules.shared.opts.data.get('remote_connection_pool_size', 10)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({'Connection': 'keep-alive'})
+            remote_transport.install(session, pool_size)
+            sessions[service] = session
+        return sessions[service]
+
+def close_sessions():
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
+    remote_transport.reset()
+
+def prewarm_session(service):
+    if not service.has_endpoint:
+        return
+
+    def warm():
+        for endpoint in get_remote_endpoints(service):
+            try:
+                get_session(service).head(endpoint, timeout=5)
+                modules.shared.log.debug(f'RI: Prewarmed connection to {endpoint}')
+            except requests.RequestException as e:
+                modules.shared.log.debug(f'RI: Unable to prewarm connection to {endpoint}: {e}')
+    threading.Thread(target=warm, daemon=True).start()
+
+REQUEST_TIMEOUT = (10, 60)
+GENERATION_TIMEOUT = (10, None)
+
+def request_or_error(service, path, no_headers=False, method='GET', data=None, endpoint=None, timeout=REQUEST_TIMEOUT):
     headers = None if no_headers else build_header(service)
+    debug = modules.shared.log.isEnabledFor(logging.DEBUG)
 
     try:
         data = clean_payload_dict(data)
-        url = get_remote_endpoint(service)+path
-        modules.shared.log.debug(f'RI: payload {url}: {get_payload_str(data)}')
-        response = requests.request(method=method, url=url, headers=headers, json=data)
-        modules.shared.log.debug(f'RI: response: {get_payload_str(json.loads(response.content))}')
+        url = (endpoint or get_remote_endpoint(service))+path
+        if debug:
+            modules.shared.log.debug(f'RI: payload {url}: {get_payload_str(data)}')
+        start = time.time()
+        with remote_profiler.span('upload' if data else remote_profiler.request_phase('request'), method=method, path=path.split('?')[0], endpoint=remote_profiler.endpoint_of(url)) as span:
+            response = get_session(service).request(method=method, url=url, headers=headers, json=data, timeout=timeout)
+            span['bytes'] = len(response.request.body or b'') + len(response.content)
+        remote_metrics.request_duration.observe(time.time() - start, service=service.name, path=remote_metrics.normalize_path(path))
     except Exception as e:
         raise RemoteInferenceAPIError(service, e)
     if response.status_code not in (200, 202):
-        raise RemoteInferenceAPIError(service, f"{response.status_code}: {response.content}")
-    
-    return json.loads(response.content)
-
-cache = {}
-def get_cache_or_run(service, path, runnable, cache_time):
-    global cache
-    cache_key = (service, path)
-    if cache_key in cache:
-        result, timestamp = cache[cache_key]
-        if time.time() - timestamp <= cache_time:
-            if isinstance(result, Exception):
-                raise result
-            else:
-                return result
+        raise RemoteInferenceAPIError(service, f"{response.status_code}: {response.content}", response.status_code)
 
     try:
-        result = runnable()
-        cache[cache_key] = (result, time.time())
+        result = json.loads(response.content)
+    except ValueError as e:
+        raise RemoteInferenceAPIError(service, e)
+    finally:
+        response.close()
+    del response
+
+    if debug:
+        modules.shared.log.debug(f'RI: response: {get_payload_str(result)}')
+    return result
+
+class RemoteCache:
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.key_locks = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key, cache_time, error_cache_time):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            result, timestamp = entry
+            if time.time() - timestamp > (error_cache_time if isinstance(result, Exception) else cache_time):
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def store(self, key, result):
+        with self.lock:
+            entry = self.entries[key] = (result, time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                evicted, _ = self.entries.popitem(last=False)
+                self.key_locks.pop(evicted, None)
+            return entry
+
+    def get_or_run(self, key, runnable, cache_time, error_cache_time):
+        entry = self.lookup(key, cache_time, error_cache_time)
+        if entry is None:
+            with self.lock:
+                key_lock = self.key_locks.setdefault(key, threading.Lock())
+            with key_lock:
+                entry = self.lookup(key, cache_time, error_cache_time)
+                if entry is None:
+                    with self.lock:
+                        self.misses += 1
+                    try:
+                        result = runnable()
+                    except Exception as e:
+                        result = e
+                    entry = self.store(key, result)
+                else:
+                    with self.lock:
+                        self.hits += 1
+        else:
+            with self.lock:
+                self.hits += 1
+
+        result, _ = entry
+        if isinstance(result, Exception):
+            raise result
         return result
-    except Exception as e:
-        cache[cache_key] = (e, time.time())
-        raise e
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def pop_matching(self, predicate):
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                self.entries.pop(key)
+
+    def stats(self):
+        with self.lock:
+            return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses}
+
+cache = RemoteCache()
+remote_metrics.CollectedMetric('ri_cache_requests_total', 'Remote API cache lookups by result', lambda: [({'result': 'hit'}, cache.hits), ({'result': 'miss'}, cache.misses)], kind='counter')
+remote_metrics.CollectedMetric('ri_cache_entries', 'Entries held in the remote API cache', lambda: [({}, len(cache.entries))])
+def get_cache_or_run(service, path, runnable, cache_time, error_cache_time=None):
+    if error_cache_time is None:
+        error_cache_time = min(cache_time, modules.shared.opts.data.get('remote_error_cache_time', 30))
+    with counting_errors(service):
+        return cache.get_or_run((service, path), runnable, cache_time, error_cache_time)
+
+def is_cached(service, path, cache_time):
+    entry = cache.lookup((service, path), cache_time, 0)
+    return entry is not None and not isinstance(entry[0], Exception)
 
 def clear_cache(service, path):
-    global cache
     cache.pop((service, path))
 
+def clear_cache_prefix(service, prefix):
+    cache.pop_matching(lambda key: key[0] == service and str(key[1]).startswith(prefix))
+
 def get_or_error_with_cache(service, path, cache_time):
     runnable = lambda: request_or_error(service, path)
     return get_cache_or_run(service, path, runnable, cache_time)
 
-def download_image(img_url):
-    attempts = 5
-    while attempts > 0:
+DOWNLOAD_ATTEMPTS = 5
+DOWNLOAD_BACKOFF_BASE = 0.5
+DOWNLOAD_BACKOFF_MAX = 30
+
+class DownloadResult:
+    def __init__(self, url, image=None, error=None, attempts=1):
+        self.url = url
+        self.image = image
+        self.error = error
+        self.attempts = attempts
+
+    @property
+    def ok(self):
+        return self.image is not None
+
+download_executor = None
+host_semaphores = {}
+download_lock = threading.Lock()
+def get_download_executor():
+    global download_executor
+    with download_lock:
+        if download_executor is None:
+            download_executor = ThreadPoolExecutor(max_workers=modules.shared.opts.data.get('remote_download_threads', 16), thread_name_prefix='RI download')
+        return download_executor
+
+def get_host_semaphore(url):
+    host = urlparse(url).netloc
+    with download_lock:
+        if host not in host_semaphores:
+            host_semaphores[host] = threading.BoundedSemaphore(modules.shared.opts.data.get('remote_download_host_limit', 6))
+        return host_semaphores[host]
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after:
+        try:
+            return min(float(retry_after), DOWNLOAD_BACKOFF_MAX)
+        except ValueError:
+            try:
+                return min(max((email.utils.parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds(), 0), DOWNLOAD_BACKOFF_MAX)
+            except (TypeError, ValueError):
+                pass
+    return min(DOWNLOAD_BACKOFF_MAX, DOWNLOAD_BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1)
+
+def fetch_image(img_url):
+    error = None
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        retry_after = None
         try:
-            response = requests.get(img_url, timeout=5)
-            response.raise_for_status()
-            with io.BytesIO(response.content) as fp:
-                return Image.open(fp).copy()
-        except (requests.RequestException, Image.UnidentifiedImageError):
-            modules.shared.log.warning(f"RI: Failed to download {img_url}, retrying...")
-            attempts -= 1
-    return None
+            with get_host_semaphore(img_url), get_session().get(img_url, timeout=5, stream=True) as response:
+                if response.status_code in (429, 503):
+                    retry_after = response.headers.get('Retry-After')
+                elif 400 <= response.status_code < 500:
+                    return DownloadResult(img_url, error=requests.HTTPError(f'{response.status_code} {response.reason}'), attempts=attempt+1)
+                response.raise_for_status()
+                host = urlparse(img_url).netloc
+                start = time.time()
+                with remote_profiler.span('download', endpoint=host) as span:
+                    content = io.BytesIO()
+                    for chunk in response.iter_content(chunk_size=64*1024):
+                        content.write(chunk)
+                    span['bytes'] = content.tell()
+                    content.seek(0)
+                    image = Image.open(content)
+                    image.load()
+                remote_metrics.download_duration.observe(time.time() - start, host=host)
+                remote_metrics.download_bytes.inc(span['bytes'], host=host)
+                return DownloadResult(img_url, image=image, attempts=attempt+1)
+        except (requests.RequestException, OSError) as e:
+            error = e
+
+        if attempt < DOWNLOAD_ATTEMPTS - 1:
+            delay = backoff_delay(attempt, retry_after)
+            modules.shared.log.warning(f"RI: Failed to download {img_url}, retrying in {delay:.1f}s...")
+            time.sleep(delay)
+    return DownloadResult(img_url, error=error, attempts=DOWNLOAD_ATTEMPTS)
+
+def download_image(img_url):
+    return fetch_image(img_url).image
+
+def fetch_result(img):
+    if img.startswith('http'):
+        return fetch_image(img)
+    try:
+        with remote_profiler.span('decode', bytes=len(img)):
+            return DownloadResult('<base64>', image=decode_image(img))
+    except (ValueError, OSError) as e:
+        return DownloadResult('<base64>', error=e)
 
-def download_images(img_urls, num_threads=10):
-    with ThreadPool(num_threads) as pool:
-        images = pool.map(download_image, img_urls)
+def prefetch_image(img, on_image=None):
+    future = get_download_executor().submit(remote_profiler.propagate(fetch_result), img)
+    if on_image:
+        future.add_done_callback(lambda future: future.result().ok and on_image(future.result().image))
+    return future
 
-    return list(filter(lambda img: img is not None, images))
+def stream_images(imgs, prefetched=None):
+    fetch = remote_profiler.propagate(fetch_result)
+    prefetched = prefetched or {}
+    futures = {(prefetched.pop(img, None) or get_download_executor().submit(fetch, img)): i for i, img in enumerate(imgs)}
+    for future in as_completed(futures):
+        yield futures[future], future.result()
+
+def download_images(imgs, on_image=None, prefetched=None):
+    imgs = list(imgs)
+    results = len(imgs)*[None]
+    for i, result in stream_images(imgs, prefetched):
+        results[i] = result
+        if on_image and result.ok:
+            on_image(i, result.image)
+
+    return results
 
 def decode_image(b64):
     return Image.open(io.BytesIO(base64.b64decode(b64)))
 
+def decode_images(b64_images):
+    images = []
+    b64_images.reverse()
+    while b64_images:
+        b64 = b64_images.pop()
+        with remote_profiler.span('decode', bytes=len(b64)):
+            images.append(decode_image(b64))
+    return images
+
+def image_hash(image):
+    digest = hashlib.blake2b(f'{image.mode}{image.size}{image.info.get("transparency")}'.encode(), digest_size=16)
+    digest.update(image.tobytes())
+    palette = image.getpalette()
+    if palette:
+        digest.update(bytes(palette))
+    return digest.hexdigest()
+
+encoded_images = OrderedDict()
+encoded_images_size = 0
+encode_lock = threading.Lock()
+encode_executor = None
 def encode_image(image, format="WEBP"):
-    buffer = io.BytesIO()
-    image.save(buffer, format=format)
-    return base64.b64encode(buffer.getvalue()).decode()
+    global encoded_images_size
+    if image is None:
+        return None
+
+    key = (image_hash(image), format)
+    with encode_lock:
+        if key in encoded_images:
+            encoded_images.move_to_end(key)
+            return encoded_images[key]
+
+    with remote_profiler.span('encode', format=format) as span:
+        buffer = io.BytesIO()
+        image.save(buffer, format=format)
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+        span['bytes'] = len(encoded)
+
+    max_size = modules.shared.opts.data.get('remote_encode_cache_size', 256) * 1024**2
+    with encode_lock:
+        if key not in encoded_images:
+            encoded_images[key] = encoded
+            encoded_images_size += len(encoded)
+        while encoded_images and encoded_images_size > max_size:
+            _, evicted = encoded_images.popitem(last=False)
+            encoded_images_size -= len(evicted)
+    return encoded
+
+def encode_images(images, format="WEBP"):
+    global encode_executor
+    images = list(images)
+    if len(images) < 2:
+        return [encode_image(image, format) for image in images]
+
+    with encode_lock:
+        if encode_executor is None:
+            encode_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='RI encode')
+    return list(encode_executor.map(remote_profiler.propagate(lambda image: encode_image(image, format)), images))
 
 def get_image(img):
     if img.startswith('http'):
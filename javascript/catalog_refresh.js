@@ -0,0 +1,58 @@
+document.addEventListener('DOMContentLoaded', () => {
+    const POLL_DELAY = 2000;
+    const MAX_POLL_DELAY = 30000;
+    const IDLE_POLLS = 5;
+    let generation = null;
+    let delay = POLL_DELAY;
+    let idle = 0;
+    let active = false;
+
+    const poll = async () => {
+        let status = null;
+        try {
+            const response = await fetch('./sdapi/v1/remote-catalog-status');
+            if (response.ok) status = await response.json();
+        } catch {}
+
+        if (status) {
+            const loading = status.loading.length > 0;
+            const changed = generation !== null && status.generation !== generation;
+            generation = status.generation;
+            for (const tabname of ['txt2img', 'img2img']) {
+                const btn = gradioApp().getElementById(`${tabname}_extra_refresh`);
+                if (!btn) continue;
+                btn.classList.toggle('remote_catalog_loading', loading);
+                if (changed) btn.click();
+            }
+            if (loading || changed) {
+                idle = 0;
+                delay = POLL_DELAY;
+            } else if (!status.remote) {
+                idle = IDLE_POLLS;
+            }
+        }
+
+        if (++idle > IDLE_POLLS) {
+            active = false;
+            return;
+        }
+        if (idle > 1) delay = Math.min(delay * 2, MAX_POLL_DELAY);
+        setTimeout(poll, delay);
+    };
+
+    const wake = () => {
+        idle = 0;
+        delay = POLL_DELAY;
+        if (active) return;
+        active = true;
+        poll();
+    };
+
+    document.addEventListener('click', (event) => {
+        if (event.target.closest?.('#settings_submit, [id$="_extra_refresh"]')) wake();
+    }, true);
+    document.addEventListener('change', (event) => {
+        if (event.target.closest?.('#quicksettings')) wake();
+    }, true);
+    wake();
+});
@@ -0,0 +1,75 @@
+onUiLoaded(() => {
+    const TABS = ['txt2img', 'img2img'];
+    const KINDS = ['checkpoints', 'loras', 'embeddings'];
+    const queries = {};
+    const timers = {};
+
+    const renderPager = (tabname, kind, cards, page) => {
+        let pager = cards.previousElementSibling;
+        if (!pager || !pager.classList.contains('remote_pager')) {
+            pager = document.createElement('div');
+            pager.className = 'remote_pager';
+            cards.before(pager);
+        }
+        pager.replaceChildren();
+
+        const last = Math.min(page.offset + page.limit, page.total);
+        const button = (label, offset, enabled) => {
+            const btn = document.createElement('button');
+            btn.className = 'lg secondary gradio-button';
+            btn.textContent = label;
+            btn.disabled = !enabled;
+            btn.addEventListener('click', () => loadPage(tabname, kind, offset));
+            pager.append(btn);
+        };
+        button('Previous', Math.max(page.offset - page.limit, 0), page.offset > 0);
+        const label = document.createElement('span');
+        label.textContent = page.total ? `${page.offset + 1}-${last} of ${page.total}` : 'No matches';
+        pager.append(label);
+        button('Next', page.offset + page.limit, last < page.total);
+        pager.style.display = page.offset > 0 || last < page.total ? '' : 'none';
+    };
+
+    const loadPage = async (tabname, kind, offset) => {
+        const params = new URLSearchParams({tabname, query: queries[tabname] || '', offset});
+        let page;
+        try {
+            const response = await fetch(`./sdapi/v1/remote-networks/${kind}?${params}`);
+            if (!response.ok) return;
+            page = await response.json();
+        } catch {
+            return;
+        }
+        if (!page.remote || !page.cards_id) return;
+        const cards = gradioApp().getElementById(page.cards_id);
+        if (!cards) return;
+        cards.innerHTML = page.html;
+        renderPager(tabname, kind, cards, page);
+    };
+
+    const loadPages = (tabname) => {
+        for (const kind of KINDS) loadPage(tabname, kind, 0);
+    };
+
+    gradioApp().addEventListener('input', (e) => {
+        const match = e.target.id && e.target.id.match(/^(txt2img|img2img)_extra_search$/);
+        if (!match) return;
+        const tabname = match[1];
+
+        clearTimeout(timers[tabname]);
+        timers[tabname] = setTimeout(() => {
+            queries[tabname] = e.target.value;
+            loadPages(tabname);
+        }, 400);
+    });
+
+    gradioApp().addEventListener('click', (e) => {
+        const btn = e.target.closest?.('#txt2img_extra_refresh, #img2img_extra_refresh');
+        if (!btn) return;
+        const tabname = btn.id.split('_')[0];
+        clearTimeout(timers[`${tabname}_refresh`]);
+        timers[`${tabname}_refresh`] = setTimeout(() => loadPages(tabname), 1500);
+    }, true);
+
+    for (const tabname of TABS) loadPages(tabname);
+});
@@ -6,22 +6,33 @@ import modules.textual_inversion.textual_inversion
 import modules.ui_extra_networks_textual_inversion
 import modules.processing
 import modules.scripts_postprocessing
+import modules.postprocessing
 import modules.scripts
 import modules.script_callbacks
 import modules.shared
 from modules.shared import OptionInfo, options_section 
 
-from extension.utils_remote import make_conditional_hook, RemoteService, import_script_data
+from extension.utils_remote import make_conditional_hook, RemoteService, import_script_data, get_current_api_service, prewarm_session, close_sessions
 import extension.remote_extra_networks
 import extension.remote_process
 import extension.remote_balance
 import extension.remote_postprocess
 import extension.ui_bindings
+import extension.remote_metrics
+import extension.remote_previews
+import extension.remote_catalog_loader
 
 import ui_extra_networks_lora
 import networks
 
-def on_app_started(blocks, _app):
+# Hooked at load time since the extras tab binds run_postprocessing when the UI is created
+modules.postprocessing.run_postprocessing = extension.remote_postprocess.pipelined_postprocessing(modules.postprocessing.run_postprocessing)
+
+def on_remote_service_change():
+    prewarm_session(get_current_api_service())
+    extension.remote_extra_networks.load_remote_catalogs()
+
+def on_app_started(blocks, app):
     # SCRIPT IMPORTS
     import_script_data({
         'controlnet': 'extensions-builtin/sd-webui-controlnet/scripts/controlnet.py',
@@ -31,6 +42,9 @@ def on_app_started(blocks, _app):
         'upscale': 'scripts/postprocessing_upscale.py'
     })
 
+    # CONNECTIONS
+    prewarm_session(get_current_api_service())
+
     # EXTRA NETWORKS
     modules.sd_models.list_models = make_conditional_hook(modules.sd_models.list_models, extension.remote_extra_networks.list_remote_models)
     modules.ui_extra_networks_checkpoints.ExtraNetworksPageCheckpoints.list_items = make_conditional_hook(modules.ui_extra_networks_checkpoints.ExtraNetworksPageCheckpoints.list_items, extension.remote_extra_networks.extra_networks_checkpoints_list_items)
@@ -42,11 +56,20 @@ def on_app_started(blocks, _app):
     modules.ui_extra_networks_textual_inversion.ExtraNetworksPageTextualInversion.refresh = make_conditional_hook(modules.ui_extra_networks_textual_inversion.ExtraNetworksPageTextualInversion.refresh, extension.remote_extra_networks.extra_networks_textual_inversions_refresh)
     modules.ui_extra_networks_textual_inversion.ExtraNetworksPageTextualInversion.list_items = make_conditional_hook(modules.ui_extra_networks_textual_inversion.ExtraNetworksPageTextualInversion.list_items, extension.remote_extra_networks.extra_networks_textual_inversions_list_items)
 
+    extension.remote_extra_networks.load_remote_catalogs()
+
     # GENERATION
     modules.sd_models.reload_model_weights = make_conditional_hook(modules.sd_models.reload_model_weights, extension.remote_process.fake_reload_model_weights)
     modules.processing.process_images = make_conditional_hook(modules.processing.process_images, extension.remote_process.process_images)
     modules.scripts_postprocessing.ScriptPostprocessingRunner.run = make_conditional_hook(modules.scripts_postprocessing.ScriptPostprocessingRunner.run, extension.remote_postprocess.remote_run) 
 
+    # API
+    app.add_api_route('/sdapi/v1/remote-catalog-status', extension.remote_catalog_loader.catalog_status, methods=['GET'])
+    app.add_api_route('/sdapi/v1/remote-networks/{kind}', extension.remote_extra_networks.api_network_cards, methods=['GET'])
+    app.add_api_route(f'{extension.remote_previews.PREVIEW_PATH}/{{key}}', extension.remote_previews.preview_endpoint, methods=['GET'])
+    app.add_api_route('/sdapi/v1/remote-metrics', extension.remote_metrics.metrics_endpoint, methods=['GET'])
+    app.add_api_route(extension.remote_process.STABLEHORDE_WEBHOOK_PATH, extension.remote_process.stablehorde_webhook, methods=['POST'])
+
     # UI
     with blocks:
         gr.HTML(value='', visible=False, elem_id='remote_inference_balance', show_progress=False)
@@ -69,7 +92,8 @@ def on_ui_settings():
             'remote_stablehorde_slow_workers': OptionInfo(True, "Allow slow workers (extra kudos cost if disabled)"),
             'remote_stablehorde_workers': OptionInfo('', "Comma-separated list of allowed/disallowed workers (max 5)"),
             'remote_stablehorde_worker_blacklist': OptionInfo(False, "Above list is a blacklist instead of a whitelist"),
-            'remote_stablehorde_share_laion': OptionInfo(False, 'Share images with LAION for improving their dataset, reduce your kudos consumption by 2 (always True for anonymous users)')
+            'remote_stablehorde_share_laion': OptionInfo(False, 'Share images with LAION for improving their dataset, reduce your kudos consumption by 2 (always True for anonymous users)'),
+            'remote_stablehorde_webhook_url': OptionInfo('', 'Public https URL of this server for job completion webhooks (empty to only poll)')
         }
     }
 
@@ -81,7 +105,7 @@ def on_ui_settings():
             continue
 
         settings[f'remote_{name}_sep'] = OptionInfo(f"<h2>{service.name}</h2>", "", gr.HTML)
-        settings[f'remote_{name}_api_endpoint'] =  OptionInfo(service.default_endpoint, f'{service.name} API endpoint')
+        settings[f'remote_{name}_api_endpoint'] =  OptionInfo(service.default_endpoint, f'{service.name} API endpoint' + (' (comma-separated list for load balancing)' if service in [RemoteService.SDNext, RemoteService.ComfyUI] else ''))
 
         if not service.has_key:
             continue
@@ -98,11 +122,25 @@ def on_ui_settings():
         'remote_general_sep': OptionInfo("<h2>Other Settings</h2>", "", gr.HTML),
         'remote_balance_cache_time': OptionInfo(300, 'Cache time (in seconds) for remote balance api calls', gr.Slider, {"minimum": 300, "maximum": 3600, "step": 60}),
         'remote_extra_networks_cache_time': OptionInfo(600, 'Cache time (in seconds) for remote extra networks api calls', gr.Slider, {"minimum": 60, "maximum": 3600, "step": 60}),
+        'remote_extra_networks_page_size': OptionInfo(500, 'Remote network cards shown per page', gr.Slider, {"minimum": 50, "maximum": 5000, "step": 50}),
+        'remote_error_cache_time': OptionInfo(30, 'Cache time (in seconds) for failed remote api calls', gr.Slider, {"minimum": 0, "maximum": 600, "step": 10}),
+        'remote_profiler': OptionInfo(False, 'Record per-job remote generation profiles (cache/profiles.jsonl)'),
+        'remote_transport_mode': OptionInfo('Off', 'Record or replay remote traffic (for performance regression runs)', gr.Radio, {"choices": ['Off', 'Record', 'Replay']}, onchange=close_sessions),
+        'remote_transport_trace': OptionInfo('', 'Traffic trace file (default cache/trace.jsonl.gz)', onchange=close_sessions),
+        'remote_transport_replay_speed': OptionInfo(1.0, 'Replay speed multiplier (0 for no delay)', gr.Slider, {"minimum": 0, "maximum": 10, "step": 0.25}, onchange=close_sessions),
         'remote_show_balance_box': OptionInfo(True, "Show top right available balance box"),
         'remote_show_balance_quick': OptionInfo(True, "Show quicksettings available balance"),
         'remote_show_nsfw_models': OptionInfo(False, "Show NSFW networks (StableHorde/NovitaAI)"),
-
-        'remote_inference_service': OptionInfo(RemoteService.Local.name, "Remote inference service", gr.Dropdown, {"choices": [e.name for e in RemoteService]}),
+        'remote_preview_proxy': OptionInfo(True, "Serve remote network previews as locally cached thumbnails"),
+        'remote_preview_cache_size': OptionInfo(200, 'Disk space (in MB) for cached preview thumbnails', gr.Slider, {"minimum": 16, "maximum": 4096, "step": 16}),
+        'remote_save_queue_size': OptionInfo(64, 'Max images waiting to be saved in the background (requires restart)', gr.Slider, {"minimum": 1, "maximum": 512, "step": 1}),
+        'remote_max_parallel_jobs': OptionInfo(4, 'Max parallel remote jobs when splitting large batches', gr.Slider, {"minimum": 1, "maximum": 16, "step": 1}),
+        'remote_download_threads': OptionInfo(16, 'Shared image download threads (requires restart)', gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}),
+        'remote_download_host_limit': OptionInfo(6, 'Max concurrent image downloads per host (requires restart)', gr.Slider, {"minimum": 1, "maximum": 32, "step": 1}),
+        'remote_encode_cache_size': OptionInfo(256, 'Memory (in MB) for caching encoded init images, masks and control images', gr.Slider, {"minimum": 0, "maximum": 2048, "step": 64}),
+        'remote_connection_pool_size': OptionInfo(10, 'Max kept-alive connections per remote host', gr.Slider, {"minimum": 1, "maximum": 64, "step": 1}, onchange=close_sessions),
+
+        'remote_inference_service': OptionInfo(RemoteService.Local.name, "Remote inference service", gr.Dropdown, {"choices": [e.name for e in RemoteService]}, onchange=on_remote_service_change),
         'remote_balance': OptionInfo("", "", gr.HTML)
     })
 